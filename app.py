@@ -0,0 +1,490 @@
+import streamlit as st
+import streamlit.components.v1 as components
+
+import os
+import json
+import uuid
+import base64
+import logging
+
+import pipeline
+from pipeline import PipelineError
+from resilience import is_available, snapshot
+import rate_limiter
+from platform_adapters import detect_platform, get_adapter
+from audio_ingest import MAX_UPLOAD_BYTES, MAX_DURATION, IngestError, check_size
+from cost_accounting import TEXT_ONLY
+import warmup
+import profiler
+from session_budget import SessionRegistry
+from turn_jobs import QueueFull
+
+# One Streamlit app for every client. The pipeline lives in pipeline.py and
+# is shared by all sessions in the process; only reply playback differs by
+# platform, which is detected from the browser's user agent.
+
+logger = logging.getLogger(__name__)
+
+# How often the sidebar checks for memories added by background extraction,
+# while an extraction for the user is queued; otherwise it does not poll
+SIDEBAR_POLL = float(os.getenv("HIPPO_SIDEBAR_POLL", "3"))
+# How often a running turn is checked for progress
+TURN_POLL = float(os.getenv("HIPPO_TURN_POLL", "0.5"))
+
+
+def init_session(platform=None):
+    if "transcript_page" not in st.session_state:
+        st.session_state["transcript_page"] = 0
+
+    if "session_id" not in st.session_state:
+        # Kept in the URL so a reconnect, possibly to another replica, picks
+        # the session's artifacts back up from storage
+        session_id = st.query_params.get("session", "")
+        if len(session_id) != 32 or any(c not in "0123456789abcdef" for c in session_id):
+            session_id = uuid.uuid4().hex
+            st.query_params["session"] = session_id
+        st.session_state["session_id"] = session_id
+
+    if "profile" not in st.session_state:
+        # Decided once, so a sampled session is profiled on every run
+        st.session_state["profile"] = profiler.should_profile(st.query_params.get("profile") == "1")
+
+    if "user_id" not in st.session_state:
+        # Memories are shared only under an identity the user gave; anyone
+        # else gets memories private to their own session
+        user_id = st.query_params.get("user", "")
+        st.session_state["user_id"] = user_id or f"session:{st.session_state.session_id}"
+
+    if "platform" not in st.session_state:
+        # ?platform=ios|android overrides detection, e.g. for testing
+        platform = platform or st.query_params.get("platform")
+        st.session_state["platform"] = platform or detect_platform(st.context.headers.get("User-Agent"))
+
+
+# Heavy per-session values, kept within a byte budget and spilled to
+# storage while a session is idle
+@st.cache_resource
+def get_session_registry():
+    return SessionRegistry(pipeline.get_storage())
+
+
+# Only user actions (uploads, turns) count as activity; background refreshes
+# pass activity=False so an open but unused tab can still be spilled
+def session_artifacts(activity=True):
+    return get_session_registry().session(st.session_state.session_id, activity)
+
+
+def render_memory_html(memories):
+    memory_output = ""
+    for field in ["age", "goals", "preferences", "motivations", "health conditions"]:
+        memory_output += f"**{field.capitalize()}:**<br>"
+        items = memories.get(field, [])
+        if isinstance(items, list):
+            for item in items:
+                if item:  # Only display non-empty items
+                    memory_output += f"• {item}<br>"
+        elif items:  # For non-list items (like age)
+            memory_output += f"- {items}<br>"
+    return memory_output
+
+# The memory list is its own fragment, and rebuilds its HTML only when the
+# memory version changes. A finished turn reruns the whole page, which
+# redraws it; only a pending background extraction needs polling for.
+def render_memory_panel():
+    with profiler.profile("memory_panel", st.session_state.session_id, st.session_state.profile):
+        memory = pipeline.get_memory(st.session_state.user_id)
+        memory.refresh()
+        version = memory.version
+        artifacts = session_artifacts(activity=False)
+        cached = artifacts.peek("memory_html")
+        if cached is None or cached[0] != version:
+            cached = (version, render_memory_html(memory.snapshot()))
+            # Only a cache: fine to drop when the session is over budget
+            artifacts.set("memory_html", cached, evictable=True, activity=False)
+        st.markdown(cached[1], unsafe_allow_html=True)
+
+
+memory_panel = st.fragment(render_memory_panel)
+
+
+# Polls until the user's queued extraction has been applied, then reruns the
+# page once so the sidebar goes back to the panel that does not poll
+@st.fragment(run_every=SIDEBAR_POLL)
+def memory_panel_polling():
+    if not pipeline.extraction_pending(st.session_state.user_id):
+        st.rerun()
+    render_memory_panel()
+
+@st.fragment
+def transcript_panel():
+    # Show recent turns a page at a time instead of the whole history
+    transcript_store = pipeline.get_transcript_store()
+    user_id = st.session_state.user_id
+    has_transcript = transcript_store.has_turns(user_id)
+    if has_transcript:
+        with st.expander("Recent conversation"):
+            page = st.session_state.transcript_page
+            turns = transcript_store.recent(user_id, page=page, page_size=5)
+            for turn in turns:
+                st.markdown(f"**You:** {turn['user']}  \n**Coach:** {turn['coach']}")
+            older, newer = st.columns(2)
+            if older.button("Older", disabled=len(turns) < 5):
+                st.session_state.transcript_page += 1
+                st.rerun(scope="fragment")
+            if newer.button("Newer", disabled=page == 0):
+                st.session_state.transcript_page -= 1
+                st.rerun(scope="fragment")
+
+    # Build the transcript file only when it is asked for
+    if st.button("Prepare Full Transcript", disabled=not has_transcript):
+        st.download_button(
+            label="Download Full Transcript",
+            data=transcript_store.full_text(user_id),
+            file_name="full_transcript.txt",
+            mime="text/plain"
+        )
+
+def sidebar():
+    # Display Memory in Sidebar
+    with st.sidebar:
+        st.markdown('<h1 style="font-size: 2em;">🦛 Hippopotamus AI </h1>', unsafe_allow_html=True)
+        st.text('Ask me anything about health!')
+        st.write("### Stored Memories")
+        if pipeline.extraction_pending(st.session_state.user_id):
+            memory_panel_polling()
+        else:
+            memory_panel()
+        transcript_panel()
+
+        with st.expander("Service health"):
+            st.json({
+                **snapshot(),
+                "rate_limits": rate_limiter.snapshot(),
+                "response_cache": pipeline.get_response_cache().snapshot(),
+                "usage": pipeline.get_ledger().snapshot(),
+                "sessions": get_session_registry().snapshot(),
+                "memory_states": {"resident": len(pipeline.memory_states()), "released": pipeline._memory_sweep["released"]},
+                "turn_jobs": pipeline.get_turn_jobs().snapshot(),
+                "cpu_pool": pipeline.get_cpu_pool().snapshot(),
+            })
+
+# Improved JavaScript for Recording and Auto-Uploading Audio
+audio_recorder_script = """
+<script>
+let mediaRecorder = null;
+let audioChunks = [];
+let recordingStream = null;
+let recordingStarted = 0;
+
+// The server's upload limits, checked here first so an oversized recording
+// never leaves the phone
+const uploadLimits = __UPLOAD_LIMITS__;
+let autoStopTimer = null;
+
+// Pre-synthesized acknowledgements, played as soon as a turn is submitted
+const fillerClips = __FILLER_CLIPS__;
+let lastFiller = null;
+
+function playFiller() {
+    const seconds = (Date.now() - recordingStarted) / 1000;
+    const clips = seconds > fillerClips.longTurnSeconds ? fillerClips.long : fillerClips.short;
+    // Never the same clip twice in a row
+    const choices = clips.filter(clip => clip !== lastFiller);
+    if (!choices.length) {
+        return;
+    }
+    lastFiller = choices[Math.floor(Math.random() * choices.length)];
+    new Audio(lastFiller).play().catch(() => {});
+}
+
+async function requestMicrophonePermission() {
+    try {
+        const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+        document.getElementById('status').textContent = 'Microphone access granted';
+        stream.getTracks().forEach(track => track.stop());
+        return true;
+    } catch (err) {
+        document.getElementById('status').textContent = 'Error: ' + err.message;
+        return false;
+    }
+}
+
+async function startRecording() {
+    try {
+        // Clear previous recordings
+        audioChunks = [];
+        
+        // Get audio stream
+        recordingStream = await navigator.mediaDevices.getUserMedia({
+            audio: {
+                echoCancellation: true,
+                noiseSuppression: true
+            }
+        });
+
+        // Create recorder
+        mediaRecorder = new MediaRecorder(recordingStream);
+
+        // Handle data
+        mediaRecorder.ondataavailable = (event) => {
+            if (event.data.size > 0) {
+                audioChunks.push(event.data);
+            }
+        };
+
+        // Start recording
+        mediaRecorder.start();
+        recordingStarted = Date.now();
+        autoStopTimer = setTimeout(() => {
+            stopRecording();
+            document.getElementById('status').textContent = 'Stopped at the ' + uploadLimits.maxSeconds + 's limit';
+        }, uploadLimits.maxSeconds * 1000);
+        
+        // Update UI
+        document.getElementById('startBtn').disabled = true;
+        document.getElementById('stopBtn').disabled = false;
+        document.getElementById('status').textContent = 'Recording...';
+        
+    } catch (err) {
+        document.getElementById('status').textContent = 'Start Error: ' + err.message;
+    }
+}
+
+function stopRecording() {
+    clearTimeout(autoStopTimer);
+    if (!mediaRecorder || mediaRecorder.state === 'inactive') {
+        document.getElementById('status').textContent = 'No recording in progress';
+        return;
+    }
+
+    mediaRecorder.onstop = async () => {
+        try {
+            // Stop all tracks
+            if (recordingStream) {
+                recordingStream.getTracks().forEach(track => track.stop());
+            }
+
+            // Create blob
+            const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
+            if (audioBlob.size > uploadLimits.maxBytes) {
+                document.getElementById('status').textContent = 'Recording is too large to upload; please keep it shorter';
+                return;
+            }
+            const audioFile = new File([audioBlob], 'recording.webm', {
+                type: 'audio/webm'
+            });
+
+            // Find Streamlit's file uploader
+            const uploader = window.parent.document.querySelector('input[type="file"]');
+            if (uploader) {
+                const dt = new DataTransfer();
+                dt.items.add(audioFile);
+                uploader.files = dt.files;
+                uploader.dispatchEvent(new Event('change', { bubbles: true }));
+                document.getElementById('status').textContent = 'Recording uploaded';
+            } else {
+                document.getElementById('status').textContent = 'Error: Could not find uploader';
+            }
+        } catch (err) {
+            document.getElementById('status').textContent = 'Stop Error: ' + err.message;
+        }
+    };
+
+    mediaRecorder.stop();
+    // Still inside the click, so mobile browsers allow the playback
+    playFiller();
+    document.getElementById('startBtn').disabled = false;
+    document.getElementById('stopBtn').disabled = true;
+}
+
+// Request permission on page load, unless it has already been granted.
+// The recorder stays mounted across turns, so this runs once per page.
+window.onload = async () => {
+    try {
+        const permission = await navigator.permissions.query({ name: 'microphone' });
+        if (permission.state === 'granted') {
+            document.getElementById('status').textContent = 'Microphone access granted';
+            return;
+        }
+    } catch (err) {
+        // Older Safari cannot query the microphone permission
+    }
+    requestMicrophonePermission();
+};
+</script>
+
+<div style="padding: 20px; text-align: center;">
+    <button id="startBtn" 
+            onclick="startRecording()" 
+            style="padding: 10px 20px; margin: 5px; background-color: #4CAF50; color: white; border: none; border-radius: 5px;">
+        Start Recording
+    </button>
+    <button id="stopBtn" 
+            onclick="stopRecording()" 
+            style="padding: 10px 20px; margin: 5px; background-color: #f44336; color: white; border: none; border-radius: 5px;"
+            disabled>
+        Stop Recording
+    </button>
+    <p id="status" style="margin-top: 10px;">Waiting for microphone permission...</p>
+</div>
+"""
+
+
+def render_reply_audio(audio_html):
+    adapter = get_adapter(st.session_state.platform)
+    components.html(audio_html, height=adapter.height)
+
+def render_turn(turn):
+    if turn.get("error"):
+        st.error(turn["error"])
+        return
+    st.write(f"📝 You: {turn['transcription']}")
+    st.write(f"🤖 Coach: {turn['reply']}")
+
+# Turn a finished job into the session's last turn, and queue its audio to
+# be played once on the next run
+def finish_turn(file_id, job):
+    adapter = get_adapter(st.session_state.platform)
+    if job.error is not None:
+        message = str(job.error) if isinstance(job.error, PipelineError) else "Something went wrong. Please try again."
+        session_artifacts().set("last_turn", {"file_id": file_id, "error": message})
+        error_clip = pipeline.get_filler_library().clip("error")
+        if error_clip:
+            st.session_state["reply_audio"] = adapter.audio_html(base64.b64encode(error_clip).decode())
+        return
+
+    result = job.result
+    turn = {"file_id": file_id, "transcription": result["transcription"], "reply": result["reply"]}
+    if result["budget_mode"] == TEXT_ONLY:
+        turn["notice"] = "You've reached today's voice limit, so replies are text only until tomorrow."
+    if result["tts_error"]:
+        turn["tts_error"] = result["tts_error"]
+    elif result["audio"]:
+        with profiler.stage("embed_audio"):
+            # Convert audio to base64 for embedding
+            b64_audio = base64.b64encode(result["audio"]).decode()
+            st.session_state["reply_audio"] = adapter.audio_html(b64_audio)
+
+    # Keep the finished turn so later reruns redisplay it instead of
+    # processing the same upload again. The audio is sent to the browser
+    # once and not kept: the session holds only the text.
+    session_artifacts().set("last_turn", turn)
+
+# Polls a submitted turn, showing the transcription and reply as they
+# arrive. When the job finishes the page reruns, which stops the polling.
+@st.fragment(run_every=TURN_POLL)
+def turn_progress():
+    turn_job = st.session_state.get("turn_job")
+    if turn_job is None:
+        # Finished or lost on an earlier tick; the rerun that stops the
+        # polling is on its way
+        return
+    file_id, job_id = turn_job
+    jobs = pipeline.get_turn_jobs()
+    job = jobs.get(job_id)
+    if job is None:
+        # Expired, or submitted to a replica that has since gone away.
+        # Recording it as the upload's last turn shows the error on later
+        # runs instead of submitting the same upload again.
+        del st.session_state["turn_job"]
+        session_artifacts().set("last_turn", {"file_id": file_id, "error": "This turn was lost. Please record it again."})
+        st.rerun()
+    if "transcription" in job.progress:
+        st.write(f"📝 You: {job.progress['transcription']}")
+    if "reply" in job.progress:
+        st.write(f"🤖 Coach: {job.progress['reply']}")
+    if not job.done.is_set():
+        st.caption("Processing...")
+        return
+    jobs.collect(job_id)
+    del st.session_state["turn_job"]
+    finish_turn(file_id, job)
+    st.rerun()
+
+# Turn processing runs in a fragment: an upload reruns only this part of the
+# page, so the recorder and the sidebar are left alone
+@st.fragment
+def turn_panel():
+    with profiler.profile("turn_panel", st.session_state.session_id, st.session_state.profile):
+        handle_upload()
+
+
+def handle_upload():
+    uploaded_audio = st.file_uploader("Alternatively, upload pre-recorded audio", type=["webm"])
+    if not uploaded_audio:
+        return
+    last_turn = session_artifacts().get("last_turn")
+    if last_turn and last_turn["file_id"] == uploaded_audio.file_id:
+        if last_turn.get("notice"):
+            st.info(last_turn["notice"])
+        render_turn(last_turn)
+        if last_turn.get("tts_error"):
+            st.error(last_turn["tts_error"])
+        audio_html = st.session_state.pop("reply_audio", None)
+        if audio_html:
+            render_reply_audio(audio_html)
+        return
+    turn_job = st.session_state.get("turn_job")
+    if turn_job is None or turn_job[0] != uploaded_audio.file_id:
+        if not submit_turn(uploaded_audio):
+            return
+    turn_progress()
+
+
+def submit_turn(uploaded_audio):
+    try:
+        # Checked before getvalue() reads the whole upload into memory
+        check_size(uploaded_audio.size)
+    except IngestError as e:
+        session_artifacts().set("last_turn", {"file_id": uploaded_audio.file_id, "error": str(e)})
+        st.error(str(e))
+        return False
+    if not warmup.is_ready():
+        # Only the first turn on a cold replica can get here
+        with st.spinner("Getting ready..."):
+            warmup.wait_ready(timeout=15)
+    if not (is_available("openai") and is_available("elevenlabs")):
+        # Shed the turn instead of queueing it behind a provider that is down
+        st.error("The coach is temporarily unavailable. Please try again in a moment.")
+        return False
+    user_id = st.session_state.user_id
+    try:
+        job_id = pipeline.get_turn_jobs().submit(
+            st.session_state.session_id, uploaded_audio.getvalue(), user_id,
+            session_id=st.session_state.session_id, profile=st.session_state.profile
+        )
+    except QueueFull:
+        st.error("The coach is busy right now. Please try again in a moment.")
+        return False
+    st.session_state["turn_job"] = (uploaded_audio.file_id, job_id)
+    st.success("Audio uploaded successfully. Processing...")
+    return True
+
+
+def main(platform=None):
+    init_session(platform)
+    with profiler.profile("script", st.session_state.session_id, st.session_state.profile):
+        render_page()
+
+
+def render_page():
+    # serve.py starts warming up before the first visitor; under a plain
+    # `streamlit run` the first page view is the earliest hook there is
+    pipeline.start_warm_up()
+
+    with profiler.stage("sidebar"):
+        sidebar()
+
+    # Inject the improved JavaScript into Streamlit. It sits outside every
+    # fragment, so turns never remount it.
+    with profiler.stage("recorder"):
+        recorder_html = audio_recorder_script.replace(
+            "__UPLOAD_LIMITS__", json.dumps({"maxBytes": MAX_UPLOAD_BYTES, "maxSeconds": MAX_DURATION})
+        ).replace("__FILLER_CLIPS__", pipeline.get_filler_library().payload())
+        components.html(recorder_html, height=100)
+
+    turn_panel()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import io
+import wave
+
+import lazy_numpy
+
+# In-process decoding through libav (PyAV), so a turn does not have to fork
+# an ffmpeg process. Both imports are optional: without them callers fall
+# back to the ffmpeg subprocess. They are also deferred until first use,
+# since neither is needed to draw the first page.
+av = None
+_imported = False
+
+# Whisper resamples everything to 16 kHz mono anyway; sending it that
+# directly keeps uploads small.
+TARGET_RATE = 16000
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+class AudioTooLong(Exception):
+    pass
+
+
+def available():
+    global av, _imported
+    if not _imported:
+        try:
+            import av
+        except ImportError:
+            av = None
+        _imported = True
+    return av is not None and lazy_numpy.load() is not None
+
+
+def decode_to_pcm(source, rate=TARGET_RATE, max_seconds=None):
+    """Decode a file path or bytes buffer to a mono int16 NumPy array.
+
+    Stops with AudioTooLong as soon as more than `max_seconds` is decoded.
+    """
+    if not available():
+        raise AudioDecodeError("PyAV and NumPy are required for in-process decoding")
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    try:
+        with av.open(source) as container:
+            if not container.streams.audio:
+                raise AudioDecodeError("No audio stream found")
+            stream = container.streams.audio[0]
+            # Let libav decode on its own threads
+            stream.thread_type = "AUTO"
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=rate)
+            chunks = []
+            max_samples = None if max_seconds is None else int(max_seconds * rate)
+            decoded = 0
+            for frame in container.decode(stream):
+                for resampled in resampler.resample(frame):
+                    chunks.append(resampled.to_ndarray().reshape(-1))
+                    decoded += len(chunks[-1])
+                if max_samples is not None and decoded > max_samples:
+                    raise AudioTooLong(f"Recording is longer than {max_seconds:.0f}s")
+            for resampled in resampler.resample(None):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+    except (AudioDecodeError, AudioTooLong):
+        raise
+    except Exception as e:
+        # libav raises a family of FFmpegError subclasses that varies by version
+        raise AudioDecodeError(f"Could not decode audio: {e}") from e
+    np = lazy_numpy.load()
+    if not chunks:
+        return np.zeros(0, dtype=np.int16)
+    return np.concatenate(chunks).astype(np.int16, copy=False)
+
+
+def write_wav(samples, path, rate=TARGET_RATE):
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.tobytes())
+
+
+def decode_to_wav(source, wav_path, rate=TARGET_RATE, max_seconds=None):
+    """Decode `source` to a 16-bit mono WAV file and return the samples."""
+    samples = decode_to_pcm(source, rate, max_seconds)
+    write_wav(samples, wav_path, rate)
+    return samples
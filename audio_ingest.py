@@ -0,0 +1,95 @@
+import os
+
+import audio_decode
+
+# Uploads are checked before anything expensive runs: size while they are
+# streamed to disk, then format and duration from the container header.
+MAX_UPLOAD_BYTES = int(float(os.getenv("HIPPO_MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+MAX_DURATION = float(os.getenv("HIPPO_MAX_AUDIO_SECONDS", "300"))
+CHUNK_SIZE = 64 * 1024
+
+# MediaRecorder produces WebM in most browsers and MP4 in Safari, whatever
+# the file is called
+CONTAINER_MAGIC = [
+    (0, b"\x1a\x45\xdf\xa3", "webm"),
+    (4, b"ftyp", "mp4"),
+    (0, b"OggS", "ogg"),
+    (0, b"RIFF", "wav"),
+]
+
+
+class IngestError(Exception):
+    """The upload was rejected; the message is fit to show the user."""
+
+
+def sniff_format(head):
+    for offset, magic, name in CONTAINER_MAGIC:
+        if head[offset:offset + len(magic)] == magic:
+            return name
+    return None
+
+
+def check_size(size, max_bytes=MAX_UPLOAD_BYTES):
+    """Reject an upload by its declared size, before reading any of it."""
+    if size is not None and size > max_bytes:
+        raise IngestError(f"The recording is too large ({size // 1024} KB, limit {max_bytes // 1024} KB).")
+
+
+def stream_to_file(source, path, max_bytes=MAX_UPLOAD_BYTES):
+    """Copy a file-like upload to `path` in fixed-size chunks.
+
+    Returns the detected container format. Raises IngestError as soon as
+    the upload is too big or does not look like audio.
+    """
+    check_size(getattr(source, "size", None), max_bytes)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    written = 0
+    container = None
+    with open(path, "wb") as f:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if container is None:
+                container = sniff_format(chunk)
+                if container is None:
+                    raise IngestError("The upload is not a supported audio recording.")
+            written += len(chunk)
+            if written > max_bytes:
+                raise IngestError(f"The recording is too large (limit {max_bytes // 1024} KB).")
+            f.write(chunk)
+    if container is None:
+        raise IngestError("The recording is empty.")
+    return container
+
+
+def probe(path, max_duration=MAX_DURATION):
+    """Check the container header; returns the duration in seconds, or None.
+
+    Browsers often leave the duration out of recorded WebM headers; the
+    decoder enforces the limit for those instead.
+    """
+    if not audio_decode.available():
+        return None
+    av = audio_decode.av
+    try:
+        with av.open(path) as container:
+            if not container.streams.audio:
+                raise IngestError("The recording has no audio in it.")
+            duration = container.duration
+    except IngestError:
+        raise
+    except Exception as e:
+        raise IngestError("The recording is damaged and could not be read.") from e
+    if duration is None:
+        return None
+    seconds = duration / 1_000_000
+    if seconds > max_duration:
+        raise IngestError(f"The recording is too long ({seconds:.0f}s, limit {max_duration:.0f}s).")
+    return seconds
+
+
+def ingest(source, path, max_bytes=MAX_UPLOAD_BYTES, max_duration=MAX_DURATION):
+    container = stream_to_file(source, path, max_bytes)
+    return container, probe(path, max_duration)
@@ -0,0 +1,58 @@
+"""Latency benchmark for conversation archive lookups.
+
+Fills a throwaway archive with synthetic turns for one user (Zipf-distributed
+vocabulary, so common words behave like they do in real transcripts), plus
+turns from other users drawn from the same vocabulary, and reports search
+latency percentiles for the one user.
+
+    python benchmark_conversation_archive.py [--turns 100000] [--other-users 1000] [--queries 200]
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from conversation_archive import ConversationArchive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=100000)
+    parser.add_argument("--other-users", type=int, default=1000)
+    parser.add_argument("--turns-per-other-user", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--vector-index", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(args.vocabulary)]
+    weights = [1.0 / (i + 1) for i in range(args.vocabulary)]
+
+    def sentence(length):
+        return " ".join(rng.choices(vocabulary, weights, k=length))
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive = ConversationArchive(os.path.join(directory, "bench.db"), vector_index=args.vector_index)
+        start = time.perf_counter()
+        # One transaction per user; add_turn commits per turn
+        archive.add_turns("bench", ((0.0, sentence(12), sentence(25)) for _ in range(args.turns)))
+        for i in range(args.other_users):
+            archive.add_turns(f"other{i}", ((0.0, sentence(12), sentence(25)) for _ in range(args.turns_per_other_user)))
+        total = args.turns + args.other_users * args.turns_per_other_user
+        print(f"loaded {total} turns in {time.perf_counter() - start:.1f}s")
+
+        timings = []
+        for _ in range(args.queries):
+            query = sentence(10)
+            start = time.perf_counter()
+            archive.search("bench", query)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        for p in (50, 95, 99):
+            print(f"p{p}: {timings[min(len(timings) - 1, len(timings) * p // 100)]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
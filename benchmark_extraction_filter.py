@@ -0,0 +1,92 @@
+"""Precision/recall benchmark for the local extraction pre-filter.
+
+Runs k-fold cross-validation over data/extraction_samples.jsonl and reports,
+per threshold, how many LLM extraction calls would be skipped and how many
+real facts would be missed by skipping them.
+
+    python benchmark_extraction_filter.py [--folds 5] [--samples path]
+"""
+import argparse
+import random
+
+from extraction_filter import (
+    THRESHOLD, SAMPLES_FILE, MAYBE_AGE, load_samples, needs_llm_label, train, extraction_score, extract_age,
+)
+
+
+# Numbers after "I'm" that are not ages; none may be taken as one locally
+NOT_AGES = [
+    "I'm 12 weeks pregnant",
+    "I'm 20 years sober",
+    "I'm 25 years into my career",
+    "I'm 16 days out from my race",
+    "I'm 30 days into the challenge",
+    "I'm 10 months postpartum",
+    "I'm 45 seconds off my best time",
+    "I'm 15 reps short of my goal",
+    "I'm 80 kilos now",
+    "I am 5 minutes late for the gym",
+    "I'm 3 weeks into physio",
+    "I turned 40 laps into 50",
+    "my dog is 12 years old",
+    "As a 12-year-old I broke my leg",
+    "As an 18 year old I ran track",
+    "When I was 15 years old I swam every day",
+    "I was 20 years old when I started lifting",
+    "When I turned 30, I ran my first marathon",
+    "When I'm 40, I want to still be running",
+    "Once I turned 50 my knees got worse",
+]
+
+
+def cross_validated_scores(samples, folds, seed=0):
+    shuffled = list(samples)
+    random.Random(seed).shuffle(shuffled)
+    scored = []
+    for k in range(folds):
+        held_out = shuffled[k::folds]
+        training = [s for i, s in enumerate(shuffled) if i % folds != k]
+        model = train(training)
+        scored += [(extraction_score(s["text"], model), needs_llm_label(s)) for s in held_out]
+    return scored
+
+
+def report(scored, threshold):
+    tp = sum(1 for score, label in scored if score >= threshold and label)
+    fp = sum(1 for score, label in scored if score >= threshold and not label)
+    fn = sum(1 for score, label in scored if score < threshold and label)
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    skip_rate = sum(1 for score, _ in scored if score < threshold) / len(scored)
+    return precision, recall, skip_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--samples", default=SAMPLES_FILE)
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    scored = cross_validated_scores(samples, args.folds)
+
+    print(f"{len(samples)} samples, {args.folds}-fold cross-validation")
+    print(f"{'threshold':>10} {'precision':>10} {'recall':>8} {'skip rate':>10}")
+    for threshold in sorted({0.2, 0.3, THRESHOLD, 0.4, 0.5, 0.6, 0.7}):
+        precision, recall, skip_rate = report(scored, threshold)
+        marker = "  <- HIPPO_FILTER_THRESHOLD" if threshold == THRESHOLD else ""
+        print(f"{threshold:>10.2f} {precision:>10.3f} {recall:>8.3f} {skip_rate:>10.3f}{marker}")
+
+    aged = [s for s in samples if "age" in s["fields"]]
+    found = sum(1 for s in aged if extract_age(s["text"]) is not None)
+    deferred = sum(1 for s in aged if extract_age(s["text"]) is None and MAYBE_AGE.search(s["text"]))
+    false_ages = sum(1 for s in samples if "age" not in s["fields"] and extract_age(s["text"]) is not None)
+    print(f"\nlocal age extraction: {found}/{len(aged)} found, {deferred} left to the LLM, {false_ages} false positives")
+    misread = [text for text in NOT_AGES if extract_age(text) is not None]
+    print(f"non-age numbers: {len(misread)}/{len(NOT_AGES)} misread as ages")
+    for text in misread:
+        print(f"  {text!r} -> {extract_age(text)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Checks for chunked transcription of long recordings: seams are only
+de-duplicated where chunks overlap, and a recording at the upload length
+limit is transcribed within the time the turn reserves for it.
+
+    python check_chunked_transcription.py
+"""
+import sys
+import time
+
+import numpy as np
+
+import chunked_transcription
+from audio_ingest import MAX_DURATION
+from hedging import TurnBudget, DeadlineExceeded
+
+RATE = 16000
+
+
+def speech(seconds, pauses=()):
+    # Noise stands in for speech; pauses are stretches of silence
+    samples = np.random.default_rng(0).normal(0, 3000, int(seconds * RATE)).astype(np.int16)
+    for at in pauses:
+        samples[int((at - 2) * RATE):int((at + 2) * RATE)] = 0
+    return samples
+
+
+def check_stitch():
+    assert chunked_transcription.stitch(["I said no no", "no more"], [False]) == "I said no no no more"
+    assert chunked_transcription.stitch(["I said no no", "no more"], [True]) == "I said no no more"
+    _, overlapping = chunked_transcription.split_points(speech(100, pauses=(30, 60)), RATE)
+    assert overlapping == [False, False, True], overlapping
+
+
+def check_max_length():
+    # Scaled down: each chunk takes 0.4s against an allowance of 0.5s, and
+    # the turn's own transcription share (0.6s) is far too short for the
+    # three waves of chunks a maximum-length recording needs
+    chunked_transcription.CHUNK_TIME = 0.5
+    samples = speech(MAX_DURATION)
+
+    def transcribe(chunk_file):
+        time.sleep(0.4)
+        return chunk_file[0]
+
+    try:
+        chunked_transcription.transcribe_chunked(samples, RATE, transcribe, TurnBudget(total=2.0))
+        raise AssertionError("the unextended budget should have run out")
+    except DeadlineExceeded:
+        # Let the abandoned chunks already in flight finish
+        time.sleep(0.5)
+
+    budget = TurnBudget(total=2.0)
+    chunked_transcription.reserve_time(budget, samples, RATE)
+    allowed = budget.stage_budget("transcribe")
+    start = time.monotonic()
+    text = chunked_transcription.transcribe_chunked(samples, RATE, transcribe, budget)
+    ranges, _ = chunked_transcription.split_points(samples, RATE)
+    assert text == " ".join(f"chunk{index}.wav" for index in range(len(ranges))), text
+    print(f"{MAX_DURATION:.0f}s recording: {len(ranges)} chunks in {time.monotonic() - start:.1f}s, "
+          f"{allowed:.1f}s allowed")
+
+
+def main():
+    check_stitch()
+    print("stitching: only overlapping seams de-duplicated ok")
+    check_max_length()
+    print("maximum-length recording: transcribed within its reserved time ok")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
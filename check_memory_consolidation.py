@@ -0,0 +1,91 @@
+"""Checks for memory consolidation: rewordings of a fact are merged under
+their newest wording, while facts that update or contradict an earlier one
+(a changed number, a negation) are left for the LLM summary to resolve.
+
+    python check_memory_consolidation.py
+"""
+import os
+import sys
+import time
+
+import memory_model
+from memory_consolidation import merge_similar, conflicting_fields, consolidate
+
+
+# Recent enough that nothing expires
+START = time.time() - 7 * 86400
+
+
+def memory_with(field, *texts):
+    # One fact per text, each stated a day after the one before
+    memory = memory_model.UserMemory()
+    for day, text in enumerate(texts):
+        memory.observe(field, text, now=START + day * 86400)
+    return memory
+
+
+def texts(memory, field):
+    return [fact.text for fact in memory.facts[field].values()]
+
+
+def check_changed_number_not_merged():
+    memory = memory_with("goals", "lose 10 pounds before summer", "lose 20 pounds before summer")
+    assert merge_similar(memory) == 0
+    assert texts(memory, "goals") == ["lose 10 pounds before summer", "lose 20 pounds before summer"]
+    assert conflicting_fields(memory) == {"goals"}
+
+
+def check_negation_not_merged():
+    memory = memory_with("preferences", "enjoys running outdoors", "no longer enjoys running outdoors")
+    assert merge_similar(memory) == 0
+    assert texts(memory, "preferences") == ["enjoys running outdoors", "no longer enjoys running outdoors"]
+    assert conflicting_fields(memory) == {"preferences"}
+
+
+def check_rewording_keeps_newest_text():
+    memory = memory_with("preferences", "enjoys running outdoors", "really enjoys running outdoors")
+    assert merge_similar(memory) == 1
+    [fact] = memory.facts["preferences"].values()
+    assert fact.text == "really enjoys running outdoors", fact
+    assert list(memory.facts["preferences"]) == ["really enjoys running outdoors"]
+    assert fact.hits == 2 and fact.first_seen == START and fact.last_seen == START + 86400
+    assert not conflicting_fields(memory)
+
+
+def check_summary_resolves_conflict():
+    memory = memory_with("goals", "lose 10 pounds before summer", "lose 20 pounds before summer")
+    summaries = {"goals": (texts(memory, "goals"), ["lose 20 pounds before summer"])}
+    assert consolidate(memory, now=START + 86400, summaries=summaries)
+    assert texts(memory, "goals") == ["lose 20 pounds before summer"]
+
+
+def check_conflicts_sent_to_summary():
+    # A conflicting field is summarized even though it is under the cap
+    os.environ["HIPPO_STORAGE_URL"] = "local://"
+    import pipeline
+    asked = {}
+
+    def summarize(field, field_texts, usage=None):
+        asked[field] = field_texts
+        return ["no longer enjoys running outdoors"]
+
+    pipeline.summarize_facts = summarize
+    memory = memory_with("preferences", "enjoys running outdoors", "no longer enjoys running outdoors")
+    state = pipeline.MemoryState("check-consolidation", memory)
+    state.consolidate()
+    assert asked == {"preferences": ["enjoys running outdoors", "no longer enjoys running outdoors"]}, asked
+    assert state.snapshot()["preferences"] == ["no longer enjoys running outdoors"]
+
+
+def main():
+    check_changed_number_not_merged()
+    check_negation_not_merged()
+    check_rewording_keeps_newest_text()
+    check_summary_resolves_conflict()
+    print("merging: rewordings merged, updates and contradictions kept apart ok")
+    check_conflicts_sent_to_summary()
+    print("summary: conflicting facts resolved by the summary pass ok")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Consistency checks for the storage backends and shared-memory writes.
+
+Runs the same checks against file storage, the in-process Redis stand-in
+and, when --url is given, a real Redis-compatible server: blob and log
+operations, compare-and-set under contention, two replicas updating one
+user's memories, and a write-behind writer whose storage fails.
+
+    python check_storage.py [--url redis://localhost:6379/15]
+"""
+import os
+import sys
+import logging
+import argparse
+import tempfile
+import threading
+
+import storage
+import memory_model
+from persistence import WriteBehindWriter
+
+
+def check_blobs_and_logs(store):
+    store.put("memories/a.mem", b"one")
+    assert store.get("memories/a.mem") == b"one"
+    store.delete("memories/a.mem")
+    assert store.get("memories/a.mem") is None
+
+    key = "transcripts/check.jsonl"
+    assert not store.log_length_hint(key)
+    for i in range(23):
+        store.append(key, str(i).encode())
+    assert store.log_length_hint(key)
+    assert store.tail(key, 0, 3) == [b"22", b"21", b"20"]
+    assert store.tail(key, 20, 5) == [b"2", b"1", b"0"]
+    assert store.tail(key, 25, 5) == []
+    assert list(store.iter_log(key)) == [str(i).encode() for i in range(23)]
+    store.delete(key)
+
+
+def check_update(store):
+    key = "memories/counter.mem"
+    store.delete(key)
+    threads = [
+        threading.Thread(target=lambda: [
+            store.update(key, lambda value: str(int(value or b"0") + 1).encode()) for _ in range(50)
+        ])
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.get(key) == b"200", store.get(key)
+    store.delete(key)
+
+
+def check_replicas(url):
+    # Two pipelines sharing one store stand in for two replicas
+    os.environ["HIPPO_MEMORY_REFRESH"] = "0"
+    import pipeline
+    shared = storage.open_storage(url) if url else storage.RedisStorage(storage.LocalRedis())
+    pipeline._singletons["storage"] = shared
+    shared.delete(pipeline.memory_key("check"))
+    replica_a = pipeline.MemoryState("check", *pipeline.load_memory_record("check"))
+    replica_b = pipeline.MemoryState("check", *pipeline.load_memory_record("check"))
+    # Each replica has its own writer; both update before either has written
+    writers = []
+    for replica, goal in ((replica_a, "run a 5k"), (replica_b, "swim twice a week")):
+        pipeline._singletons["memory_writer"] = WriteBehindWriter(interval=60, write_fn=pipeline.write_memory_record)
+        writers.append(pipeline._singletons["memory_writer"])
+        replica.update({"goals": [goal]})
+    for writer in writers:
+        writer.flush()
+    stored = memory_model.decode(shared.get(pipeline.memory_key("check")))
+    assert sorted(stored.values("goals")) == ["run a 5k", "swim twice a week"], stored.values("goals")
+    replica_a.refresh(force=True)
+    assert sorted(replica_a.snapshot()["goals"]) == ["run a 5k", "swim twice a week"]
+    shared.delete(pipeline.memory_key("check"))
+
+
+def check_writer_survives_failures():
+    written = {}
+    failures = [2]
+
+    def flaky(path, data):
+        if failures[0]:
+            failures[0] -= 1
+            raise RuntimeError("storage unavailable")
+        written[path] = data
+
+    logging.getLogger("persistence").setLevel(logging.CRITICAL)
+    writer = WriteBehindWriter(interval=0.01, write_fn=flaky)
+    writer.enqueue("key", b"data")
+    for _ in range(3):
+        writer.flush()
+    assert written == {"key": b"data"}, written
+    assert not writer.is_pending("key")
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="A Redis-compatible server to check as well")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {"file": storage.FileStorage(directory), "local": storage.RedisStorage(storage.LocalRedis())}
+        if args.url:
+            stores["redis"] = storage.open_storage(args.url)
+        for name, store in stores.items():
+            check_blobs_and_logs(store)
+            check_update(store)
+            print(f"{name}: blobs, logs and updates ok")
+        check_writer_survives_failures()
+        print("write-behind writer: retries after storage errors ok")
+        os.chdir(directory)
+        check_replicas(args.url)
+        print("replicas: concurrent memory updates merged ok")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import io
+import os
+import re
+import math
+import wave
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import lazy_numpy
+from hedging import DeadlineExceeded
+
+# Long recordings are cut at pauses into chunks of about this length and
+# transcribed concurrently; anything shorter than LONG_AUDIO_SECONDS keeps
+# the single-request path.
+CHUNK_SECONDS = float(os.getenv("HIPPO_TRANSCRIBE_CHUNK", "30"))
+LONG_AUDIO_SECONDS = float(os.getenv("HIPPO_TRANSCRIBE_LONG", "45"))
+MAX_PARALLEL = int(os.getenv("HIPPO_TRANSCRIBE_PARALLEL", "4"))
+# Time allowed for one chunk's request; a long recording's transcription
+# gets this for every wave of MAX_PARALLEL chunks
+CHUNK_TIME = float(os.getenv("HIPPO_TRANSCRIBE_CHUNK_TIME", "10"))
+# How far either side of a target cut to look for a pause
+SEARCH_SECONDS = 5.0
+FRAME_SECONDS = 0.02
+# Frames this much quieter than the recording's median count as silence
+SILENCE_RATIO = 0.1
+# Where no pause is found the chunks overlap by this much, and the words
+# repeated at the seam are removed when stitching
+OVERLAP_SECONDS = 1.0
+
+_executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL, thread_name_prefix="transcribe-chunk")
+
+
+def frame_energy(samples, rate):
+    np = lazy_numpy.load()
+    frame = max(1, int(rate * FRAME_SECONDS))
+    count = len(samples) // frame
+    frames = samples[:count * frame].astype(np.float32).reshape(count, frame)
+    return np.sqrt((frames ** 2).mean(axis=1)), frame
+
+
+def split_points(samples, rate, chunk_seconds=CHUNK_SECONDS):
+    """Return (start, end) sample ranges covering the recording, in order,
+    and for each seam between them whether the two chunks overlap."""
+    np = lazy_numpy.load()
+    energy, frame = frame_energy(samples, rate)
+    silence = np.median(energy) * SILENCE_RATIO if len(energy) else 0.0
+    chunk_frames = int(chunk_seconds / FRAME_SECONDS)
+    search = int(SEARCH_SECONDS / FRAME_SECONDS)
+    overlap = int(OVERLAP_SECONDS * rate)
+    ranges = []
+    overlapping = []
+    start_frame = 0
+    start = 0
+    while len(energy) - start_frame > chunk_frames + search:
+        target = start_frame + chunk_frames
+        window = energy[target - search:target + search]
+        cut_frame = target - search + int(np.argmin(window))
+        cut = cut_frame * frame
+        ranges.append((start, cut))
+        # Cut mid-word? Then let the next chunk start a little early
+        start = cut if energy[cut_frame] <= silence else max(0, cut - overlap)
+        overlapping.append(start < cut)
+        start_frame = cut_frame
+    ranges.append((start, len(samples)))
+    return ranges, overlapping
+
+
+def _words(text):
+    return [re.sub(r"[^\w']", "", word.lower()) for word in text.split()]
+
+
+def stitch(texts, overlapping, max_overlap_words=8):
+    """Join chunk transcripts, dropping words repeated across the seams
+    where the chunks overlap. At a pause nothing was heard twice, so a
+    repeated word there ("no, no") was really said twice."""
+    result = []
+    for index, text in enumerate(texts):
+        words = text.split()
+        if result and words and overlapping[index - 1]:
+            tail = _words(" ".join(result[-max_overlap_words:]))
+            head = _words(" ".join(words[:max_overlap_words]))
+            for size in range(min(len(tail), len(head)), 0, -1):
+                if tail[-size:] == head[:size]:
+                    words = words[size:]
+                    break
+        result.extend(words)
+    return " ".join(result)
+
+
+def wav_file(samples, rate, name):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.tobytes())
+    return (name, buffer.getvalue(), "audio/wav")
+
+
+def read_wav(path):
+    np = lazy_numpy.load()
+    with wave.open(path, "rb") as wav:
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16), wav.getframerate()
+
+
+def is_long(samples, rate):
+    return samples is not None and len(samples) > LONG_AUDIO_SECONDS * rate and lazy_numpy.load() is not None
+
+
+def time_needed(samples, rate):
+    """How long transcribing `samples` in chunks may take."""
+    # A cut can come up to SEARCH_SECONDS early
+    chunks = max(1, math.ceil(len(samples) / ((CHUNK_SECONDS - SEARCH_SECONDS) * rate)))
+    return math.ceil(chunks / MAX_PARALLEL) * CHUNK_TIME
+
+
+def reserve_time(budget, samples, rate):
+    # The turn's transcription share is sized for a short recording; a
+    # long one within the upload limits gets the time its chunks need
+    budget.extend("transcribe", time_needed(samples, rate) - budget.stage_budget("transcribe"))
+
+
+def transcribe_chunked(samples, rate, transcribe_fn, budget=None):
+    """Transcribe `samples` as concurrent chunks; `transcribe_fn(file)` gets
+    an (name, bytes, content type) tuple and returns text. Raises
+    DeadlineExceeded if the chunks are not all back within the turn
+    budget's share for transcription."""
+    timeout = budget.stage_budget("transcribe") if budget else None
+    if timeout is not None and timeout <= 0:
+        raise DeadlineExceeded("No time left in the turn budget for transcribe")
+    ranges, overlapping = split_points(samples, rate)
+    futures = [
+        _executor.submit(transcribe_fn, wav_file(samples[start:end], rate, f"chunk{index}.wav"))
+        for index, (start, end) in enumerate(ranges)
+    ]
+    _, pending = wait(futures, timeout=timeout)
+    if pending:
+        # Chunks still queued behind other turns' are dropped; ones already
+        # in flight finish in the background and are ignored
+        for future in pending:
+            future.cancel()
+        raise DeadlineExceeded(f"transcribe did not answer within {timeout:.1f}s")
+    # Any chunk that still fails after its own retries fails the whole turn
+    return stitch([future.result().strip() for future in futures], overlapping)
@@ -0,0 +1,254 @@
+import os
+import re
+import zlib
+from collections import OrderedDict
+import hashlib
+import sqlite3
+import threading
+
+import lazy_numpy
+from extraction_filter import tokenize
+
+ARCHIVE_DB = os.getenv("HIPPO_ARCHIVE_DB", "conversations.db")
+# The vector index keeps one dense row per turn in memory; it is optional
+# and needs NumPy.
+VECTOR_INDEX = os.getenv("HIPPO_VECTOR_INDEX", "0") == "1"
+EMBEDDING_DIMS = 256
+RECALL_TOKEN_BUDGET = int(os.getenv("HIPPO_RECALL_TOKENS", "300"))
+# Only the rarest few query terms are searched for: common words match a
+# large share of a user's history and make ranking cost grow with it.
+MAX_QUERY_TERMS = 4
+# Terms found in more of a user's turns than this carry almost no signal
+# for that user and are treated as stopwords; this bounds how many rows a
+# search can rank. Counted per user, so a word everyone says stays
+# searchable for a user who rarely says it.
+MAX_TERM_DOCS = int(os.getenv("HIPPO_RECALL_MAX_TERM_DOCS", "1000"))
+# Embedding rows kept in memory across all users (about 1 KB each); the
+# least recently searched users are dropped first
+VECTOR_CACHE_ROWS = int(os.getenv("HIPPO_VECTOR_CACHE_ROWS", "100000"))
+
+STOPWORDS = set("""
+a an and are as at be but by can do does for from how i i'm if in is it its me my of on or should so
+that the this to was what when where which who why will with you your it's am have has had about
+""".split())
+
+
+def user_key(user_id):
+    return "u" + hashlib.sha1(user_id.encode()).hexdigest()[:16]
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def embed(text, dims=EMBEDDING_DIMS):
+    """Signed feature-hashing embedding of word uni/bigrams, L2-normalized."""
+    return embed_tokens([t for t in tokenize(text) if t not in STOPWORDS], dims)
+
+
+def embed_tokens(tokens, dims=EMBEDDING_DIMS):
+    np = lazy_numpy.load()
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vector = np.zeros(dims, dtype=np.float32)
+    for gram in grams:
+        h = zlib.crc32(gram.encode())
+        vector[h % dims] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def query_terms(text):
+    return list(dict.fromkeys(t for t in tokenize(text) if t not in STOPWORDS and len(t) > 2))
+
+
+def fts_query(terms):
+    if not terms:
+        return None
+    return " OR ".join('"' + re.sub(r'"', "", t) + '"' for t in terms)
+
+
+def turn_terms(user_text, coach_text):
+    return set(query_terms(f"{user_text} {coach_text}"))
+
+
+class ConversationArchive:
+    def __init__(self, path=ARCHIVE_DB, vector_index=VECTOR_INDEX):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.vector_index = vector_index and lazy_numpy.load() is not None
+        # user key -> (turn ids, matrix of embeddings), loaded on first
+        # search and kept in least recently used order
+        self._vectors = OrderedDict()
+        self._vector_rows = 0
+        with self._lock:
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS turns (
+                    id INTEGER PRIMARY KEY,
+                    user_key TEXT NOT NULL,
+                    started REAL NOT NULL,
+                    user_text TEXT NOT NULL,
+                    coach_text TEXT NOT NULL,
+                    embedding BLOB
+                );
+                CREATE INDEX IF NOT EXISTS turns_user ON turns (user_key, id);
+                CREATE TABLE IF NOT EXISTS user_terms (
+                    user_key TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    docs INTEGER NOT NULL,
+                    PRIMARY KEY (user_key, term)
+                ) WITHOUT ROWID;
+            """)
+            self._migrate()
+
+    def _migrate(self):
+        # Archives from before per-user search indexed text only, and kept
+        # document frequencies across all users
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(turns_fts)")]
+        if "user_key" not in columns:
+            self._conn.executescript("""
+                DROP TRIGGER IF EXISTS turns_ai;
+                DROP TABLE IF EXISTS turns_vocab;
+                DROP TABLE IF EXISTS turns_fts;
+                CREATE VIRTUAL TABLE turns_fts USING fts5 (
+                    user_key, user_text, coach_text,
+                    content='turns', content_rowid='id'
+                );
+                CREATE TRIGGER turns_ai AFTER INSERT ON turns BEGIN
+                    INSERT INTO turns_fts (rowid, user_key, user_text, coach_text)
+                    VALUES (new.id, new.user_key, new.user_text, new.coach_text);
+                END;
+                INSERT INTO turns_fts (turns_fts) VALUES ('rebuild');
+            """)
+        if self._conn.execute("SELECT 1 FROM user_terms LIMIT 1").fetchone() is None:
+            counts = {}
+            for key, user_text, coach_text in self._conn.execute("SELECT user_key, user_text, coach_text FROM turns"):
+                for term in turn_terms(user_text, coach_text):
+                    counts[key, term] = counts.get((key, term), 0) + 1
+            self._conn.executemany(
+                "INSERT INTO user_terms (user_key, term, docs) VALUES (?, ?, ?)",
+                ((key, term, docs) for (key, term), docs in counts.items()),
+            )
+        self._conn.commit()
+
+    def add_turns(self, user_id, turns):
+        """Archive (started, user_text, coach_text) turns in one transaction."""
+        key = user_key(user_id)
+        turn_ids = []
+        with self._lock:
+            counts = {}
+            for started, user_text, coach_text in turns:
+                vector = embed(f"{user_text} {coach_text}") if self.vector_index else None
+                cursor = self._conn.execute(
+                    "INSERT INTO turns (user_key, started, user_text, coach_text, embedding) VALUES (?, ?, ?, ?, ?)",
+                    (key, started, user_text, coach_text, vector.tobytes() if vector is not None else None),
+                )
+                turn_ids.append(cursor.lastrowid)
+                if vector is not None and key in self._vectors:
+                    ids, matrix = self._vectors[key]
+                    self._vectors[key] = (ids + [cursor.lastrowid], lazy_numpy.load().vstack([matrix, vector]))
+                    self._vector_rows += 1
+                for term in turn_terms(user_text, coach_text):
+                    counts[term] = counts.get(term, 0) + 1
+            self._conn.executemany(
+                "INSERT INTO user_terms (user_key, term, docs) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_key, term) DO UPDATE SET docs = docs + excluded.docs",
+                ((key, term, docs) for term, docs in counts.items()),
+            )
+            self._conn.commit()
+        return turn_ids
+
+    def add_turn(self, user_id, started, user_text, coach_text):
+        return self.add_turns(user_id, [(started, user_text, coach_text)])[0]
+
+    def _rarest_terms(self, key, terms):
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        rows = self._conn.execute(
+            f"SELECT docs, term FROM user_terms WHERE user_key = ? AND term IN ({placeholders}) AND docs <= ?",
+            (key, *terms, MAX_TERM_DOCS),
+        ).fetchall()
+        return [term for _, term in sorted(rows)[:MAX_QUERY_TERMS]]
+
+    def search_text(self, user_id, text, limit=5):
+        key = user_key(user_id)
+        with self._lock:
+            query = fts_query(self._rarest_terms(key, query_terms(text)))
+            if query is None:
+                return []
+            # Matching on the user's key in the index keeps the search to
+            # their own turns rather than filtering everyone's afterwards
+            rows = self._conn.execute(
+                "SELECT t.id, t.started, t.user_text, t.coach_text FROM turns_fts f "
+                "JOIN turns t ON t.id = f.rowid WHERE turns_fts MATCH ? "
+                "ORDER BY f.rank LIMIT ?",
+                (f'user_key:"{key}" AND ({query})', limit),
+            ).fetchall()
+        return rows
+
+    def _load_vectors(self, key):
+        np = lazy_numpy.load()
+        if key in self._vectors:
+            self._vectors.move_to_end(key)
+        else:
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM turns WHERE user_key = ? AND embedding IS NOT NULL ORDER BY id", (key,)
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            if rows:
+                matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+            else:
+                matrix = np.zeros((0, EMBEDDING_DIMS), dtype=np.float32)
+            self._vectors[key] = (ids, matrix)
+            self._vector_rows += len(ids)
+            while self._vector_rows > VECTOR_CACHE_ROWS and len(self._vectors) > 1:
+                _, (evicted, _) = self._vectors.popitem(last=False)
+                self._vector_rows -= len(evicted)
+        return self._vectors[key]
+
+    def search_vector(self, user_id, text, limit=5):
+        if not self.vector_index:
+            return []
+        key = user_key(user_id)
+        with self._lock:
+            ids, matrix = self._load_vectors(key)
+            if not ids:
+                return []
+            scores = matrix @ embed(text)
+            top = lazy_numpy.load().argsort(-scores)[:limit]
+            top_ids = [ids[i] for i in top if scores[i] > 0]
+            if not top_ids:
+                return []
+            placeholders = ",".join("?" * len(top_ids))
+            rows = self._conn.execute(
+                f"SELECT id, started, user_text, coach_text FROM turns WHERE id IN ({placeholders})", top_ids
+            ).fetchall()
+        by_id = {row[0]: row for row in rows}
+        return [by_id[i] for i in top_ids if i in by_id]
+
+    def search(self, user_id, text, limit=5):
+        # Reciprocal rank fusion of the keyword and vector results
+        scores = {}
+        rows = {}
+        for results in (self.search_text(user_id, text, limit), self.search_vector(user_id, text, limit)):
+            for rank, row in enumerate(results):
+                scores[row[0]] = scores.get(row[0], 0.0) + 1.0 / (60 + rank)
+                rows[row[0]] = row
+        return [rows[i] for i in sorted(scores, key=scores.get, reverse=True)[:limit]]
+
+    def recall_context(self, user_id, text, token_budget=RECALL_TOKEN_BUDGET):
+        """Format the most relevant past exchanges, within a token budget."""
+        lines = []
+        used = 0
+        for _, _, user_text, coach_text in self.search(user_id, text):
+            line = f"- User said: {user_text} / You replied: {coach_text}"
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                break
+            lines.append(line)
+            used += cost
+        if not lines:
+            return ""
+        return "Relevant things from past conversations:\n" + "\n".join(lines)
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from conversation_archive import user_key, estimate_tokens
+from persistence import WriteBehindWriter, write_json_atomic
+
+# Usage is counted in the units each provider bills (audio seconds, prompt
+# and completion tokens, characters) and priced here. Totals are kept in
+# memory and written behind to one file per day.
+USAGE_DIR = os.getenv("HIPPO_USAGE_DIR", "usage")
+USAGE_FLUSH_INTERVAL = float(os.getenv("HIPPO_USAGE_FLUSH", "30"))
+# Per-user daily spend in USD; 0 turns budgets off
+USER_DAILY_BUDGET = float(os.getenv("HIPPO_USER_DAILY_BUDGET", "0.50"))
+# Past this share of the budget replies are kept short; past all of it
+# they are text only
+SHORT_REPLIES_AT = float(os.getenv("HIPPO_BUDGET_SHORT_AT", "0.8"))
+MAX_SESSIONS = 10000
+# Spend made for no one user, such as the filler clips every turn shares
+SHARED_ACCOUNT = "shared"
+
+FULL = "full"
+SHORT = "short"
+TEXT_ONLY = "text"
+
+# USD per unit
+PRICES = {
+    "openai:whisper-1:seconds": 0.006 / 60,
+    "openai:gpt-4o-mini:prompt_tokens": 0.15 / 1_000_000,
+    "openai:gpt-4o-mini:completion_tokens": 0.60 / 1_000_000,
+    "openai:tts-1:characters": 15.0 / 1_000_000,
+    "elevenlabs::characters": float(os.getenv("HIPPO_ELEVENLABS_PRICE_PER_1K", "0.30")) / 1000,
+}
+
+
+def unit_key(provider, model, unit):
+    return f"{provider}:{model or ''}:{unit}"
+
+
+def price(units):
+    return sum(PRICES.get(key, 0.0) * amount for key, amount in units.items())
+
+
+def add_units(totals, units):
+    for key, amount in units.items():
+        totals[key] = totals.get(key, 0) + amount
+
+
+class TurnUsage:
+    """Units used by one turn, filled in as its requests finish."""
+
+    def __init__(self):
+        self.units = {}
+        self._lock = threading.Lock()
+        # Set once the turn is recorded; a request still in flight then (a
+        # hedge's loser) is billed straight to the ledger when it finishes
+        self._late = None
+
+    def add(self, provider, model, unit, amount):
+        key = unit_key(provider, model, unit)
+        with self._lock:
+            late = self._late
+            if late is None:
+                self.units[key] = self.units.get(key, 0) + amount
+                return
+        late({key: amount})
+
+    def close(self, late):
+        """Return the units so far; later ones go to `late(units)`."""
+        with self._lock:
+            self._late = late
+            return dict(self.units)
+
+    def add_completion(self, model, response, messages=None, max_tokens=0):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.add("openai", model, "prompt_tokens", usage.prompt_tokens)
+            self.add("openai", model, "completion_tokens", usage.completion_tokens)
+        elif messages is not None:
+            # No usage in the response: estimate, assuming the whole reply
+            # allowance was used
+            self.add("openai", model, "prompt_tokens", sum(estimate_tokens(m["content"]) for m in messages))
+            self.add("openai", model, "completion_tokens", max_tokens)
+
+    def cost(self):
+        return price(self.units)
+
+
+def today():
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+class Ledger:
+    def __init__(self, directory=USAGE_DIR, daily_budget=USER_DAILY_BUDGET):
+        self.directory = directory
+        self.daily_budget = daily_budget
+        self._lock = threading.Lock()
+        self._day = today()
+        # user key -> units used today
+        self._users = self._load(self._day)
+        # session id -> units used, for the most recent sessions only
+        self._sessions = OrderedDict()
+        # Enqueued per change but only copied and written once per flush
+        self._writer = WriteBehindWriter(interval=USAGE_FLUSH_INTERVAL, write_fn=self._write)
+        self.turns = 0
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f"{day}.json")
+
+    def _load(self, day):
+        try:
+            with open(self.path_for(day)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, path, day):
+        with self._lock:
+            if day != self._day:
+                return
+            totals = {key: dict(units) for key, units in self._users.items()}
+        os.makedirs(self.directory, exist_ok=True)
+        write_json_atomic(path, totals)
+
+    def _roll_over(self):
+        day = today()
+        if day != self._day:
+            self._day = day
+            self._users = {}
+
+    def record(self, user_id, units, session_id=None):
+        if not units:
+            return
+        with self._lock:
+            self._roll_over()
+            add_units(self._users.setdefault(user_key(user_id), {}), units)
+            if session_id is not None:
+                add_units(self._sessions.setdefault(session_id, {}), units)
+                self._sessions.move_to_end(session_id)
+                if len(self._sessions) > MAX_SESSIONS:
+                    self._sessions.popitem(last=False)
+            day = self._day
+        self._writer.enqueue(self.path_for(day), day)
+
+    def record_usage(self, user_id, usage, session_id=None):
+        self.record(user_id, usage.close(lambda units: self.record(user_id, units, session_id)), session_id)
+
+    def record_turn(self, user_id, usage, session_id=None):
+        self.turns += 1
+        self.record_usage(user_id, usage, session_id)
+
+    def daily_cost(self, user_id):
+        with self._lock:
+            self._roll_over()
+            return price(self._users.get(user_key(user_id), {}))
+
+    def session_cost(self, session_id):
+        with self._lock:
+            return price(self._sessions.get(session_id, {}))
+
+    def mode(self, user_id):
+        """How much a user's next turn may spend: FULL, SHORT or TEXT_ONLY."""
+        if not self.daily_budget:
+            return FULL
+        spent = self.daily_cost(user_id) / self.daily_budget
+        if spent >= 1.0:
+            return TEXT_ONLY
+        if spent >= SHORT_REPLIES_AT:
+            return SHORT
+        return FULL
+
+    def snapshot(self):
+        with self._lock:
+            self._roll_over()
+            totals = {}
+            over_budget = 0
+            shared = user_key(SHARED_ACCOUNT)
+            for key, units in self._users.items():
+                add_units(totals, units)
+                if key != shared and self.daily_budget and price(units) >= self.daily_budget:
+                    over_budget += 1
+            users = len(self._users) - (shared in self._users)
+        return {
+            "day": self._day,
+            "cost_usd": round(price(totals), 4),
+            "users": users,
+            "users_over_budget": over_budget,
+            "units": {key: round(amount, 1) for key, amount in totals.items()},
+        }
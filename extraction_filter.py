@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import math
+import zlib
+import random
+from functools import lru_cache
+
+# Decides locally whether an utterance is worth an extraction LLM call, and
+# pulls out the facts that a regex can handle (age) without one.
+
+SAMPLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "extraction_samples.jsonl")
+THRESHOLD = float(os.getenv("HIPPO_FILTER_THRESHOLD", "0.35"))
+N_FEATURES = 2 ** 14
+
+# Stored age is single-valued, so a local match replaces it without an LLM
+# check. Only unambiguous phrasings count: a bare "I'm <n>" has to end the
+# clause ("I'm 40, and..."), since "I'm 12 weeks pregnant" or "I'm 20 years
+# sober" are not ages, and "<n> years old" has to be about the speaker now:
+# "as a 12-year-old" or "when I turned 30" is about the past.
+NOT_NOW = r"(?<!\bwhen )(?<!\bif )(?<!\bonce )"
+AGE_END = r"(?=\s*(?:$|[.,;:!?]|and\b|but\b|so\b|now\b|this year\b|next\b))"
+AGE_PATTERNS = [
+    re.compile(NOT_NOW + r"\bi(?:'m| am)\s+(?:an?\s+)?(\d{1,3})[\s-]years?[\s-]old\b", re.I),
+    re.compile(NOT_NOW + r"\bi(?:'m| am)\s+(\d{1,3})" + AGE_END, re.I),
+    re.compile(r"\bmy age is\s+(\d{1,3})\b", re.I),
+    re.compile(NOT_NOW + r"\bi (?:just )?turned\s+(\d{1,3})" + AGE_END, re.I),
+]
+# A number after "I'm" or "turned", or "as a <n>-year-old", that none of
+# the above accepted may still be an age; the LLM decides
+MAYBE_AGE = re.compile(r"\b(?:i'm|i am|turned|as)\s+(?:an?\s+)?\d{1,3}\b", re.I)
+
+LEXICONS = {
+    "goals": [
+        "i want to", "i'd like to", "i would like to", "my goal", "goal is", "trying to", "i'm training",
+        "i plan to", "i hope to", "i'm hoping", "working towards", "my aim", "my target", "i need to",
+    ],
+    "preferences": [
+        "i like", "i love", "i hate", "i prefer", "i'd rather", "i enjoy", "i don't like", "i don't eat",
+        "i don't drink", "i can't stand", "vegetarian", "vegan", "pescatarian", "keto", "i usually", "i only have",
+    ],
+    "motivations": [
+        "because", "so i can", "so that", "my doctor", "my kids", "my children", "grandkids", "wedding",
+        "i'm worried", "sick of it",
+    ],
+    "health conditions": [
+        "i have", "i've got", "i had", "diabetes", "asthma", "blood pressure", "cholesterol", "pregnant",
+        "allergic", "intolerant", "arthritis", "migraine", "injury", "injured", "surgery", "diagnosed",
+        "medication", "hurts", "pain", "recovering", "heart attack", "apnea",
+    ],
+}
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def features(text):
+    """Hashed unigram and bigram counts, as a sparse {index: value} dict."""
+    tokens = tokenize(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vector = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode()) % N_FEATURES
+        vector[index] = vector.get(index, 0.0) + 1.0
+    if vector:
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        vector = {i: v / norm for i, v in vector.items()}
+    return vector
+
+
+class LinearModel:
+    def __init__(self):
+        self.weights = {}
+        self.bias = 0.0
+
+    def score(self, vector):
+        z = self.bias + sum(self.weights.get(i, 0.0) * v for i, v in vector.items())
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def fit(self, vectors, labels, epochs=30, learning_rate=0.5, l2=1e-4, seed=0):
+        # Plain logistic regression with SGD: the training set is tiny
+        rng = random.Random(seed)
+        order = list(range(len(vectors)))
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for k in order:
+                vector, label = vectors[k], labels[k]
+                error = self.score(vector) - label
+                for i, v in vector.items():
+                    w = self.weights.get(i, 0.0)
+                    self.weights[i] = w - learning_rate * (error * v + l2 * w)
+                self.bias -= learning_rate * error
+        return self
+
+
+def load_samples(path=SAMPLES_FILE):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def needs_llm_label(sample):
+    # Age alone is handled locally, so only the other fields need the LLM
+    return 1 if any(field != "age" for field in sample["fields"]) else 0
+
+
+def train(samples):
+    return LinearModel().fit([features(s["text"]) for s in samples], [needs_llm_label(s) for s in samples])
+
+
+@lru_cache(maxsize=1)
+def default_model():
+    return train(load_samples())
+
+
+def extract_age(text):
+    for pattern in AGE_PATTERNS:
+        match = pattern.search(text)
+        if match and 10 <= int(match.group(1)) <= 110:
+            return int(match.group(1))
+    return None
+
+
+def lexicon_hits(text):
+    lowered = text.lower()
+    return [field for field, phrases in LEXICONS.items() if any(phrase in lowered for phrase in phrases)]
+
+
+def extraction_score(text, model=None):
+    score = (model or default_model()).score(features(text))
+    if lexicon_hits(text):
+        # A lexicon hit is strong evidence; lift it over the threshold
+        score = max(score, 0.5 + score / 2)
+    return score
+
+
+def prefilter(text, threshold=THRESHOLD, model=None):
+    """Return (local_facts, needs_llm) for an utterance.
+
+    local_facts holds whatever was extracted without an LLM call (currently
+    only age) and is None when nothing was found.
+    """
+    age = extract_age(text)
+    local_facts = {"age": age} if age is not None else None
+    needs_llm = extraction_score(text, model) >= threshold or (age is None and MAYBE_AGE.search(text) is not None)
+    return local_facts, needs_llm
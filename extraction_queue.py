@@ -0,0 +1,114 @@
+import os
+import time
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Utterances for the same user are held for up to this many seconds, or until
+# this many have piled up, and then extracted in a single LLM call.
+COALESCE_WINDOW = float(os.getenv("HIPPO_EXTRACTION_WINDOW", "20"))
+COALESCE_MAX_BATCH = int(os.getenv("HIPPO_EXTRACTION_BATCH", "4"))
+
+
+def coalesce_utterances(utterances):
+    if len(utterances) == 1:
+        return utterances[0]
+    return "\n".join(f"- {utterance}" for utterance in utterances)
+
+
+class ExtractionQueue:
+    """Coalesces utterances per key and extracts each batch in one call.
+
+    The key names the memory state the facts belong to: `extract_fn(text,
+    key)` extracts and `apply_fn(key, extracted, source)` applies the result
+    to that state, whichever session the utterances came from. `apply_fn`
+    also gets the sources submitted with the batch's utterances and how
+    long the extraction took.
+    """
+
+    def __init__(self, extract_fn, apply_fn, window=COALESCE_WINDOW, max_batch=COALESCE_MAX_BATCH):
+        self.extract_fn = extract_fn
+        self.apply_fn = apply_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}
+        # Users whose batch has been taken but not yet applied
+        self._running = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.calls = 0
+        self.utterances = 0
+        self.seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="extraction-queue", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id, utterance, source=None):
+        """Queue an utterance; the result is applied on the worker thread."""
+        with self._cond:
+            entry = self._pending.setdefault(user_id, {"since": time.monotonic(), "utterances": [], "sources": []})
+            entry["utterances"].append(utterance)
+            entry["sources"].append(source)
+            self._cond.notify()
+
+    def is_pending(self, user_id):
+        """True until everything queued for `user_id` has been applied."""
+        with self._cond:
+            return user_id in self._pending or user_id in self._running
+
+    def _due(self, now, force=False):
+        due = []
+        for user_id, entry in list(self._pending.items()):
+            if force or len(entry["utterances"]) >= self.max_batch or now - entry["since"] >= self.window:
+                due.append((user_id, self._pending.pop(user_id)))
+                self._running.add(user_id)
+        return due
+
+    def _next_wakeup(self, now):
+        if not self._pending:
+            return None
+        oldest = min(entry["since"] for entry in self._pending.values())
+        return max(0.0, oldest + self.window - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._due(time.monotonic(), force=self._stopped)
+                while not due and not self._stopped:
+                    self._cond.wait(self._next_wakeup(time.monotonic()))
+                    due = self._due(time.monotonic(), force=self._stopped)
+                stopped = self._stopped
+            for user_id, entry in due:
+                self._extract(user_id, entry)
+            if stopped and not due:
+                return
+
+    def _extract(self, user_id, entry):
+        utterances = entry["utterances"]
+        self.calls += 1
+        self.utterances += len(utterances)
+        try:
+            start = time.monotonic()
+            extracted = self.extract_fn(coalesce_utterances(utterances), user_id)
+            seconds = time.monotonic() - start
+            self.seconds += seconds
+            self.apply_fn(user_id, extracted, entry["sources"], seconds)
+        except Exception:
+            logger.exception("Background extraction failed for user %s", user_id)
+        finally:
+            with self._cond:
+                self._running.discard(user_id)
+
+    def flush(self):
+        with self._cond:
+            due = self._due(time.monotonic(), force=True)
+        for user_id, entry in due:
+            self._extract(user_id, entry)
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=30)
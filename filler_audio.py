@@ -0,0 +1,100 @@
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Short clips the recorder plays the moment a turn is submitted, so the user
+# hears the coach respond while the real reply is still being made. They are
+# synthesized once per voice and kept on disk.
+FILLER_DIR = os.getenv("HIPPO_FILLER_DIR", "fillers")
+# Recordings longer than this get a "thinking" clip rather than a quick
+# acknowledgement, since their reply takes longer too
+LONG_TURN_SECONDS = float(os.getenv("HIPPO_FILLER_LONG_TURN", "8"))
+
+# Every phrase leads into an answer, so the reply that follows reads as the
+# rest of the same sentence rather than a new start.
+PHRASES = {
+    "short": ["Okay.", "Got it.", "Mm-hmm.", "Sure."],
+    "long": ["Okay, let me think about that.", "Thanks for sharing that. Give me a second.", "Alright, let me think."],
+    "error": ["Sorry, I didn't catch that. Could you try again?"],
+}
+
+
+class FillerLibrary:
+    def __init__(self, voice_id, synthesize_fn, directory=FILLER_DIR):
+        self.voice_id = voice_id
+        self.synthesize_fn = synthesize_fn
+        self.directory = directory
+        self._lock = threading.Lock()
+        # One ensure() at a time, so no clip is paid for twice
+        self._ensure_lock = threading.Lock()
+        self._payload = None
+
+    def path_for(self, text):
+        digest = hashlib.sha1(f"{self.voice_id}:{text}".encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{digest}.mp3")
+
+    def ensure(self):
+        """Synthesize any missing clips; returns how many were made."""
+        with self._ensure_lock:
+            return self._ensure()
+
+    def _ensure(self):
+        os.makedirs(self.directory, exist_ok=True)
+        made = 0
+        for phrases in PHRASES.values():
+            for text in phrases:
+                path = self.path_for(text)
+                if os.path.exists(path):
+                    continue
+                try:
+                    audio = self.synthesize_fn(text)
+                except Exception as e:
+                    logger.warning("Could not synthesize filler %r: %s", text, e)
+                    continue
+                with open(f"{path}.tmp", "wb") as f:
+                    f.write(audio)
+                os.replace(f"{path}.tmp", path)
+                made += 1
+        if made:
+            with self._lock:
+                self._payload = None
+        return made
+
+    def clips(self, category):
+        clips = []
+        for text in PHRASES[category]:
+            try:
+                with open(self.path_for(text), "rb") as f:
+                    clips.append(f.read())
+            except FileNotFoundError:
+                continue
+        return clips
+
+    def clip(self, category):
+        clips = self.clips(category)
+        return clips[0] if clips else None
+
+    def payload(self):
+        """JSON for the recorder: data URIs of the clips it can play."""
+        with self._lock:
+            if self._payload is None:
+                clips = {
+                    category: [f"data:audio/mpeg;base64,{base64.b64encode(clip).decode()}" for clip in self.clips(category)]
+                    for category in ("short", "long")
+                }
+                clips["longTurnSeconds"] = LONG_TURN_SECONDS
+                self._payload = json.dumps(clips)
+            return self._payload
+
+
+if __name__ == "__main__":
+    # Pre-generate the clips at build time: python filler_audio.py
+    logging.basicConfig(level=logging.INFO)
+    import pipeline
+    made = pipeline.get_filler_library().ensure()
+    print(f"Synthesized {made} filler clips into {FILLER_DIR}")
@@ -0,0 +1,170 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import profiler
+
+# Hedge a call once it has been outstanding longer than this percentile of
+# the stage's recently observed latencies.
+HEDGE_PERCENTILE = float(os.getenv("HIPPO_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HIPPO_HEDGE_MIN_DELAY", "0.75"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HIPPO_HEDGE_MIN_SAMPLES", "20"))
+
+# Total time a turn may take, and the share of it each stage is allowed.
+TURN_DEADLINE = float(os.getenv("HIPPO_TURN_DEADLINE", "25"))
+STAGE_SHARES = {
+    "transcribe": 0.3,
+    "extract": 0.2,
+    "complete": 0.3,
+    "tts": 0.3,
+}
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class LatencyTracker:
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self):
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(stage):
+    with _trackers_lock:
+        if stage not in _trackers:
+            _trackers[stage] = LatencyTracker()
+        return _trackers[stage]
+
+
+class TurnBudget:
+    def __init__(self, total=TURN_DEADLINE, shares=None):
+        self.total = total
+        self.shares = shares or STAGE_SHARES
+        # Shares are of the turn's base deadline; extend() adds time on top
+        self.base = total
+        self.extra = {}
+        self.started = time.monotonic()
+        self.timings = {}
+
+    def remaining(self):
+        return max(0.0, self.total - (time.monotonic() - self.started))
+
+    def stage_budget(self, stage):
+        share = self.shares.get(stage, 1.0) * self.base + self.extra.get(stage, 0.0)
+        return min(share, self.remaining())
+
+    def extend(self, stage, seconds):
+        """Give `stage`, and so the turn, `seconds` more, for work whose size
+        is only known once the turn has started (e.g. a long recording)."""
+        if seconds > 0:
+            self.extra[stage] = self.extra.get(stage, 0.0) + seconds
+            self.total += seconds
+
+    def stage_clock(self, stage):
+        """A function giving the time left in `stage`, starting now. Calls
+        that begin later, like a hedge or a queued chunk, take their
+        timeout from it so nothing outlives the stage."""
+        deadline = time.monotonic() + self.stage_budget(stage)
+        return lambda: max(0.0, deadline - time.monotonic())
+
+    @contextmanager
+    def stage(self, name):
+        # Records how long the stage actually took, for the turn log
+        start = time.monotonic()
+        try:
+            with profiler.stage(name):
+                yield
+        finally:
+            self.timings[name] = round(time.monotonic() - start, 3)
+
+
+def hedge_delay(stage, budget=None):
+    tracker = get_tracker(stage)
+    delay = None
+    if tracker.count() >= HEDGE_MIN_SAMPLES:
+        delay = tracker.percentile(HEDGE_PERCENTILE)
+    if delay is None:
+        # Not enough history yet: hedge at half the stage budget.
+        delay = budget.stage_budget(stage) / 2 if budget else None
+    if delay is None:
+        return None
+    return max(HEDGE_MIN_DELAY, delay)
+
+
+def hedged_call(stage, primary, fallback=None, budget=None):
+    """Run an idempotent call, issuing a hedge if it is slow.
+
+    The hedge is `fallback` if given, otherwise a second `primary`. The first
+    successful answer wins; a loser that has not started yet is cancelled and
+    one that is already in flight has its result dropped.
+    """
+    timeout = budget.stage_budget(stage) if budget else None
+    if timeout is not None and timeout <= 0:
+        raise DeadlineExceeded(f"No time left in the turn budget for {stage}")
+
+    start = time.monotonic()
+    deadline = start + timeout if timeout is not None else None
+    pending = {_executor.submit(primary)}
+    hedge = fallback or primary
+    hedged = False
+    last_error = None
+
+    while pending:
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            break
+        wait_for = None if deadline is None else deadline - now
+        if not hedged:
+            delay = hedge_delay(stage, budget)
+            if delay is not None:
+                until_hedge = max(0.0, start + delay - now)
+                wait_for = until_hedge if wait_for is None else min(wait_for, until_hedge)
+
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            for loser in pending:
+                loser.cancel()
+            get_tracker(stage).record(time.monotonic() - start)
+            return result
+
+        if not hedged and (not done or not pending):
+            # Either the hedge delay elapsed or the primary failed outright.
+            pending.add(_executor.submit(hedge))
+            hedged = True
+
+    for loser in pending:
+        loser.cancel()
+    if pending or last_error is None:
+        raise DeadlineExceeded(f"{stage} did not answer within {timeout:.1f}s")
+    raise last_error
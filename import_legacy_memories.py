@@ -0,0 +1,36 @@
+"""Import the single-user JSON memory file into one user's memories.
+
+Memories used to live in one user_memories.json shared by everyone. They
+are not picked up automatically; this merges them into the memories of the
+user named on the command line, whose existing facts are kept.
+
+    python import_legacy_memories.py --user alice [--file user_memories.json]
+"""
+import sys
+import argparse
+
+import pipeline
+import memory_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user", required=True, help="The user id (the ?user= value) to import into")
+    parser.add_argument("--file", default="user_memories.json")
+    args = parser.parse_args()
+
+    with open(args.file, "rb") as f:
+        legacy = memory_model.decode(f.read())
+
+    def merge(stored):
+        memory = pipeline.decode_memory(stored, args.user) if stored is not None else None
+        memory = memory if memory is not None else memory_model.UserMemory()
+        memory.absorb(legacy)
+        return memory_model.encode(memory)
+
+    pipeline.get_storage().update(pipeline.memory_key(args.user), merge)
+    print(f"Imported {args.file} into the memories of {args.user}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
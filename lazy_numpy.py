@@ -0,0 +1,18 @@
+# NumPy is optional (the vector index, the response cache, long recordings
+# and in-process decoding use it) and slow to import, so modules load it
+# through here on first use instead of when they are imported.
+_numpy = None
+_imported = False
+
+
+def load():
+    """The numpy module, or None when it is not installed."""
+    global _numpy, _imported
+    if not _imported:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+        _imported = True
+    return _numpy
@@ -0,0 +1,206 @@
+import os
+import re
+import time
+import atexit
+import logging
+import threading
+
+from extraction_filter import tokenize
+from conversation_archive import STOPWORDS
+from memory_model import MemoryFact, SINGLE_VALUED
+
+logger = logging.getLogger(__name__)
+
+# Hard cap on facts kept per field; anything past it is summarized or dropped
+MAX_FACTS_PER_FIELD = int(os.getenv("HIPPO_MAX_FACTS_PER_FIELD", "8"))
+# Facts not mentioned again for this long are forgotten
+FACT_TTL = float(os.getenv("HIPPO_FACT_TTL_DAYS", "180")) * 86400
+# Every known user is consolidated this often, and straight away once they
+# have more facts than the threshold.
+CONSOLIDATE_INTERVAL = float(os.getenv("HIPPO_CONSOLIDATE_INTERVAL", "3600"))
+CONSOLIDATE_THRESHOLD = int(os.getenv("HIPPO_CONSOLIDATE_THRESHOLD", "24"))
+# Token overlap above which two facts are taken to say the same thing
+MERGE_SIMILARITY = 0.6
+# Words that reverse a fact. Similar facts that differ in these, or in any
+# number, are an update rather than a rewording ("no longer enjoys running",
+# "lose 20 pounds"), so they are left for the summary to resolve.
+NEGATIONS = set("""
+no not never none nor without stopped quit longer anymore don't doesn't didn't isn't aren't wasn't
+can't cannot won't wouldn't shouldn't haven't hasn't
+""".split())
+# Never expired by age alone: the coach must not forget a health condition
+# just because it has not come up lately
+NEVER_EXPIRE = {"age", "health conditions"}
+
+
+def fact_terms(text):
+    return {t for t in tokenize(text) if t not in STOPWORDS}
+
+
+def similarity(a, b):
+    terms_a, terms_b = fact_terms(a), fact_terms(b)
+    if not terms_a or not terms_b:
+        return 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+def conflicts(a, b):
+    tokens_a, tokens_b = set(tokenize(a)), set(tokenize(b))
+    numbers_a = {t for t in tokens_a if re.search(r"\d", t)}
+    numbers_b = {t for t in tokens_b if re.search(r"\d", t)}
+    return (tokens_a & NEGATIONS) != (tokens_b & NEGATIONS) or numbers_a != numbers_b
+
+
+def absorb(keep, other):
+    # The most recently stated wording wins; the history is pooled
+    keep.hits += other.hits
+    keep.first_seen = min(keep.first_seen, other.first_seen)
+    if other.last_seen > keep.last_seen:
+        keep.text = other.text
+        keep.last_seen = other.last_seen
+        keep.source_turn = other.source_turn
+
+
+def expire(memory, now, ttl=FACT_TTL):
+    removed = 0
+    for field, bucket in memory.facts.items():
+        if field in NEVER_EXPIRE:
+            continue
+        for key in [key for key, fact in bucket.items() if now - fact.last_seen > ttl]:
+            del bucket[key]
+            removed += 1
+    return removed
+
+
+def merge_similar(memory, threshold=MERGE_SIMILARITY):
+    """Fold rewordings of the same fact into one, keeping the newest text.
+
+    Similar facts that conflict are left alone for the summary pass.
+    """
+    merged = 0
+    for field, bucket in memory.facts.items():
+        if field in SINGLE_VALUED:
+            continue
+        before = merged
+        kept = []
+        for fact in bucket.values():
+            for other in kept:
+                if similarity(fact.text, other.text) >= threshold and not conflicts(fact.text, other.text):
+                    absorb(other, fact)
+                    merged += 1
+                    break
+            else:
+                kept.append(fact)
+        if merged > before:
+            memory.facts[field] = {fact.text.lower(): fact for fact in kept}
+    return merged
+
+
+def conflicting_fields(memory, threshold=MERGE_SIMILARITY):
+    """Fields holding similar facts that disagree, which need the summary."""
+    fields = set()
+    for field, bucket in memory.facts.items():
+        if field in SINGLE_VALUED:
+            continue
+        texts = [fact.text for fact in bucket.values()]
+        if any(
+            similarity(a, b) >= threshold and conflicts(a, b)
+            for i, a in enumerate(texts) for b in texts[i + 1:]
+        ):
+            fields.add(field)
+    return fields
+
+
+def apply_summary(memory, field, texts, summary):
+    """Replace a field with summarized facts, unless it changed meanwhile."""
+    bucket = memory.facts[field]
+    if [fact.text for fact in bucket.values()] != texts or not summary:
+        return False
+    facts = list(bucket.values())
+    first_seen = min(fact.first_seen for fact in facts)
+    latest = max(facts, key=lambda fact: fact.last_seen)
+    hits = sum(fact.hits for fact in facts)
+    bucket.clear()
+    for text in summary:
+        # The summary stands in for all of them, so it inherits their history
+        fact = MemoryFact(text, field, first_seen, latest.last_seen, max(1, hits // len(summary)), latest.source_turn)
+        bucket[text.lower()] = fact
+    return True
+
+
+def cap(memory, limit=MAX_FACTS_PER_FIELD):
+    dropped = 0
+    for field, bucket in memory.facts.items():
+        if len(bucket) <= limit:
+            continue
+        ranked = sorted(bucket.items(), key=lambda item: (item[1].hits, item[1].last_seen), reverse=True)
+        dropped += len(bucket) - limit
+        keep = {key for key, _ in ranked[:limit]}
+        memory.facts[field] = {key: fact for key, fact in bucket.items() if key in keep}
+    return dropped
+
+
+def consolidate(memory, now=None, summaries=None):
+    """Expire, merge, summarize and cap one user's facts in place.
+
+    `summaries` maps a field to (texts, summary) computed off-lock; returns
+    True if anything changed.
+    """
+    now = time.time() if now is None else now
+    changed = 0
+    # First, while the fields still hold the texts that were summarized
+    for field, (texts, summary) in (summaries or {}).items():
+        changed += apply_summary(memory, field, texts, summary)
+    changed += expire(memory, now) + merge_similar(memory)
+    changed += cap(memory)
+    return bool(changed)
+
+
+class ConsolidationJob:
+    """Background thread that keeps every user's memory within bounds."""
+
+    def __init__(self, states_fn, interval=CONSOLIDATE_INTERVAL):
+        self.states_fn = states_fn
+        self.interval = interval
+        self._requested = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._last_sweep = time.monotonic()
+        self.runs = 0
+        self._thread = threading.Thread(target=self._run, name="memory-consolidation", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def request(self, state):
+        """Ask for `state` to be consolidated soon, e.g. once it grows too big."""
+        with self._cond:
+            self._requested[id(state)] = state
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._requested and not self._stopped:
+                    wait = self._last_sweep + self.interval - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stopped:
+                    return
+                states = list(self._requested.values())
+                self._requested.clear()
+            if not states:
+                states = self.states_fn()
+                self._last_sweep = time.monotonic()
+            for state in states:
+                try:
+                    state.consolidate()
+                    self.runs += 1
+                except Exception:
+                    logger.exception("Memory consolidation failed for user %s", state.user_id)
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=30)
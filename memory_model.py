@@ -0,0 +1,163 @@
+import json
+import time
+
+from memory_schema import MEMORY_FIELDS
+
+# Optional: msgpack is smaller and several times faster than json for the
+# row layout below. Either codec can read what the other wrote.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SCHEMA_VERSION = 2
+# Field names used by older versions of the app
+FIELD_ALIASES = {"conditions": "health conditions"}
+# Single-valued fields: a new value replaces the old one
+SINGLE_VALUED = {"age"}
+# Facts are stored as rows that name their field by position
+FIELD_CODES = {field: code for code, field in enumerate(MEMORY_FIELDS)}
+
+
+class MemoryFact:
+    __slots__ = ("text", "field", "first_seen", "last_seen", "hits", "source_turn")
+
+    def __init__(self, text, field, first_seen, last_seen=None, hits=1, source_turn=None):
+        self.text = text
+        self.field = field
+        self.first_seen = first_seen
+        self.last_seen = first_seen if last_seen is None else last_seen
+        self.hits = hits
+        # Start time of the turn the fact came from, as in the transcript log
+        self.source_turn = source_turn
+
+    def to_row(self):
+        return [self.text, FIELD_CODES[self.field], self.first_seen, self.last_seen, self.hits, self.source_turn]
+
+    @classmethod
+    def from_row(cls, row):
+        text, code, first_seen, last_seen, hits, source_turn = row
+        return cls(text, MEMORY_FIELDS[code], first_seen, last_seen, hits, source_turn)
+
+    def __repr__(self):
+        return f"MemoryFact({self.field!r}, {self.text!r}, hits={self.hits})"
+
+
+class UserMemory:
+    """Everything remembered about one user, as facts grouped by field."""
+
+    __slots__ = ("facts",)
+
+    def __init__(self):
+        # field -> {normalized text: MemoryFact}, in insertion order
+        self.facts = {field: {} for field in MEMORY_FIELDS}
+
+    def observe(self, field, text, now=None, source_turn=None):
+        """Record a sighting of a fact; returns True if anything changed."""
+        field = FIELD_ALIASES.get(field, field)
+        if field not in self.facts or text is None:
+            return False
+        text = str(text).strip()
+        if not text:
+            return False
+        now = time.time() if now is None else now
+        key = text.lower()
+        bucket = self.facts[field]
+        fact = bucket.get(key)
+        if fact is not None:
+            fact.last_seen = now
+            fact.hits += 1
+            # Seeing a fact again is not a visible change
+            return False
+        if field in SINGLE_VALUED:
+            bucket.clear()
+        bucket[key] = MemoryFact(text, field, now, source_turn=source_turn)
+        return True
+
+    def merge(self, extracted, now=None, source_turn=None):
+        """Merge an extraction result in the MEMORY_DELTA_SCHEMA layout."""
+        changed = False
+        for field, value in extracted.items():
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                changed |= self.observe(field, item, now, source_turn)
+        return changed
+
+    def absorb(self, other):
+        """Union in the facts of a copy changed elsewhere (e.g. by another
+        replica); returns True if anything new was added."""
+        changed = False
+        for field, bucket in other.facts.items():
+            mine = self.facts[field]
+            for key, fact in bucket.items():
+                own = mine.get(key)
+                if own is not None:
+                    own.first_seen = min(own.first_seen, fact.first_seen)
+                    own.last_seen = max(own.last_seen, fact.last_seen)
+                    own.hits = max(own.hits, fact.hits)
+                    continue
+                if field in SINGLE_VALUED:
+                    # The most recently stated value wins
+                    current = next(iter(mine.values()), None)
+                    if current is not None and current.first_seen >= fact.first_seen:
+                        continue
+                    mine.clear()
+                mine[key] = MemoryFact(fact.text, field, fact.first_seen, fact.last_seen, fact.hits, fact.source_turn)
+                changed = True
+        return changed
+
+    def values(self, field):
+        return [fact.text for fact in self.facts[field].values()]
+
+    def all_facts(self):
+        for bucket in self.facts.values():
+            yield from bucket.values()
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.facts.values())
+
+    def to_dict(self):
+        """The plain layout the prompt and sidebar have always used."""
+        memories = {}
+        for field in MEMORY_FIELDS:
+            values = self.values(field)
+            if field in SINGLE_VALUED:
+                value = values[0] if values else None
+                memories[field] = int(value) if value is not None and value.isdigit() else value
+            else:
+                memories[field] = values
+        return memories
+
+    def to_record(self):
+        return {"v": SCHEMA_VERSION, "facts": [fact.to_row() for fact in self.all_facts()]}
+
+    @classmethod
+    def from_record(cls, record, now=None):
+        memory = cls()
+        if record.get("v") == SCHEMA_VERSION:
+            for row in record["facts"]:
+                fact = MemoryFact.from_row(row)
+                memory.facts[fact.field][fact.text.lower()] = fact
+        else:
+            # Version 1: the untyped {"age": ..., "goals": [...], ...} dict,
+            # possibly with "conditions" for "health conditions"
+            memory.merge(record, now=now)
+        return memory
+
+
+def encode(memory):
+    record = memory.to_record()
+    if msgpack is not None:
+        return msgpack.packb(record, use_bin_type=True)
+    return json.dumps(record, separators=(",", ":")).encode()
+
+
+def decode(data):
+    # JSON documents start with "{"; a msgpack map never does
+    if data[:1] == b"{":
+        record = json.loads(data)
+    elif msgpack is not None:
+        record = msgpack.unpackb(data, raw=False)
+    else:
+        raise ValueError("Memory file is msgpack-encoded but msgpack is not installed")
+    return UserMemory.from_record(record)
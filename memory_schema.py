@@ -0,0 +1,49 @@
+MEMORY_FIELDS = ["age", "goals", "preferences", "motivations", "health conditions"]
+
+
+def empty_memory():
+    return {"age": None, "goals": [], "preferences": [], "motivations": [], "health conditions": []}
+
+
+def _string_list(description):
+    return {"type": "array", "items": {"type": "string"}, "description": description}
+
+
+# Strict schemas must list every property as required and forbid extras, so
+# "nothing new" is expressed as null / empty lists rather than missing keys.
+MEMORY_DELTA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "age": {"type": ["integer", "null"], "description": "The user's age, or null if not stated"},
+        "goals": _string_list("New health or fitness goals"),
+        "preferences": _string_list("New preferences, e.g. diet or exercise likes and dislikes"),
+        "motivations": _string_list("New reasons the user gives for their goals"),
+        "health conditions": _string_list("New health conditions, injuries or medications"),
+    },
+    "required": MEMORY_FIELDS,
+    "additionalProperties": False,
+}
+
+REPLY_WITH_MEMORY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reply": {"type": "string", "description": "The coach's spoken reply to the user"},
+        "memory": MEMORY_DELTA_SCHEMA,
+    },
+    "required": ["reply", "memory"],
+    "additionalProperties": False,
+}
+
+
+FACT_SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "facts": _string_list("The merged facts, shortest faithful wording first"),
+    },
+    "required": ["facts"],
+    "additionalProperties": False,
+}
+
+
+def response_format(name, schema):
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Pending writes are flushed once this many have been queued, or once the
+# oldest has waited this long, whichever comes first.
+FLUSH_BATCH = int(os.getenv("HIPPO_FLUSH_BATCH", "32"))
+FLUSH_INTERVAL = float(os.getenv("HIPPO_FLUSH_INTERVAL", "1.0"))
+
+
+def write_bytes_atomic(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    # Make the rename itself durable
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def write_json_atomic(path, data):
+    write_bytes_atomic(path, json.dumps(data).encode())
+
+
+class WriteBehindWriter:
+    """Persists JSON documents from a background thread.
+
+    Callers enqueue a snapshot and return immediately. Successive snapshots
+    of the same path replace each other, so a burst of mutations turns into
+    a single write.
+    """
+
+    def __init__(self, batch=FLUSH_BATCH, interval=FLUSH_INTERVAL, write_fn=write_json_atomic):
+        self.batch = batch
+        self.interval = interval
+        self.write_fn = write_fn
+        self._pending = {}
+        # Taken for writing but not yet written
+        self._in_flight = set()
+        self._queued = 0
+        self._oldest = None
+        self._cond = threading.Condition()
+        # Held from taking a batch until it is written, so batches hit the
+        # disk in the order they were taken
+        self._io_lock = threading.Lock()
+        self._stopped = False
+        self.flushes = 0
+        self.writes = 0
+        self.failures = 0
+        self.enqueued = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, path, data):
+        with self._cond:
+            stopped = self._stopped
+            if not stopped:
+                self._pending[path] = data
+                self._queued += 1
+                self.enqueued += 1
+                if self._oldest is None:
+                    # Wake the worker to start the interval timer
+                    self._oldest = time.monotonic()
+                    self._cond.notify()
+                elif self._queued >= self.batch:
+                    self._cond.notify()
+        if stopped:
+            # Too late for the worker; write through so nothing is lost
+            with self._io_lock:
+                self.write_fn(path, data)
+
+    def is_pending(self, path):
+        """True until the latest data enqueued for `path` has been written."""
+        with self._cond:
+            return path in self._pending or path in self._in_flight
+
+    def _take(self):
+        pending, self._pending = self._pending, {}
+        self._in_flight = set(pending)
+        self._queued = 0
+        self._oldest = None
+        return pending
+
+    def _retry(self, path, data):
+        # Put a failed write back, unless something newer replaced it
+        with self._cond:
+            if path not in self._pending:
+                self._pending[path] = data
+                self._queued += 1
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+                    self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if self._queued >= self.batch:
+                        break
+                    if self._oldest is not None:
+                        remaining = self._oldest + self.interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                stopped = self._stopped
+            self.flush()
+            if stopped:
+                return
+
+    def _write(self, pending):
+        if not pending:
+            return
+        self.flushes += 1
+        for path, data in pending.items():
+            try:
+                self.write_fn(path, data)
+                self.writes += 1
+            except Exception:
+                # Any storage error (disk, network) must not kill the worker;
+                # the write is retried on the next flush
+                self.failures += 1
+                logger.exception("Write-behind flush of %s failed; will retry", path)
+                if not self._stopped:
+                    self._retry(path, data)
+            finally:
+                with self._cond:
+                    self._in_flight.discard(path)
+
+    def flush(self):
+        with self._io_lock:
+            with self._cond:
+                pending = self._take()
+            self._write(pending)
+
+    def close(self):
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=30)
+        # Anything enqueued while the worker was exiting
+        self.flush()
@@ -0,0 +1,839 @@
+import io
+import os
+import json
+import time
+import logging
+import wave
+import tempfile
+import threading
+import subprocess
+
+from dotenv import load_dotenv
+
+from hedging import TurnBudget, hedged_call, DeadlineExceeded
+from resilience import guarded_call, CircuitOpenError, ProviderError
+from extraction_queue import ExtractionQueue
+from extraction_filter import prefilter, default_model
+from persistence import WriteBehindWriter
+from transcript_store import TranscriptStore, TRANSCRIPT_DIR
+from storage import open_storage
+from conversation_archive import ConversationArchive, user_key, estimate_tokens
+from memory_schema import MEMORY_DELTA_SCHEMA, REPLY_WITH_MEMORY_SCHEMA, FACT_SUMMARY_SCHEMA, empty_memory, response_format
+from memory_consolidation import (
+    ConsolidationJob, consolidate, conflicting_fields, MAX_FACTS_PER_FIELD, CONSOLIDATE_THRESHOLD,
+)
+import memory_model
+import rate_limiter
+from response_cache import ResponseCache
+from filler_audio import FillerLibrary
+from rate_limiter import INTERACTIVE, BACKGROUND
+import audio_decode
+import audio_ingest
+import chunked_transcription
+import lazy_numpy
+import turn_trace
+import session_budget
+import profiler
+from turn_jobs import JobQueue, CpuPool
+import cost_accounting
+from cost_accounting import Ledger, TurnUsage
+from audio_ingest import IngestError
+import warmup
+
+# The speech-to-speech pipeline shared by every front-end: transcode,
+# transcribe, extract, remember, complete and synthesize. Nothing in here
+# touches Streamlit, so one process (and one set of pools and caches) can
+# serve every client platform.
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+VOICE_ID = os.getenv("HIPPO_VOICE_ID", "mbL34QDB5FptPamlgvX5")
+
+# Get the reply and the memory delta from a single structured-output call
+COMBINED_REPLY = os.getenv("HIPPO_COMBINED_REPLY", "0") == "1"
+
+# Memory Storage
+# One compact memory file per user
+MEMORY_DIR = os.getenv("HIPPO_MEMORY_DIR", "memories")
+# With shared storage other replicas may change a user's memories; check
+# for that at most this often
+MEMORY_REFRESH = float(os.getenv("HIPPO_MEMORY_REFRESH", "2.0"))
+# Users' memories not asked for in this long are dropped from the process
+# (they stay in storage), so memory use follows active users, not all users
+MEMORY_IDLE = float(os.getenv("HIPPO_MEMORY_IDLE", "900"))
+
+
+class PipelineError(Exception):
+    """A turn could not be completed; the message is fit to show the user."""
+
+
+_singletons = {}
+# Reentrant: factories may themselves ask for other singletons
+_singletons_lock = threading.RLock()
+
+
+def _singleton(name, factory):
+    with _singletons_lock:
+        if name not in _singletons:
+            _singletons[name] = factory()
+        return _singletons[name]
+
+
+# OpenAI Client: one pooled client per process, created on first use so the
+# SDK import stays off the path to the first page
+def get_client():
+    return warmup.openai_client(OPENAI_API_KEY)
+
+
+def provider_call(name, fn, model=None, tokens=0, priority=INTERACTIVE, max_timeout=None, bill=None):
+    """guarded_call, once the rate limiter has made room for the request.
+
+    `max_timeout` bounds the whole call: waiting for the rate limiter, every
+    attempt and the backoff between them. `bill(response)` is called for
+    every request sent, retries and hedges included, with None for one that
+    got no answer.
+    """
+    deadline = time.monotonic() + max_timeout if max_timeout is not None else None
+    rate_limiter.acquire(name, model, tokens, priority, timeout=max_timeout if priority == INTERACTIVE else None)
+    if bill is None:
+        return guarded_call(name, fn, deadline=deadline)
+
+    def billed(timeout):
+        try:
+            response = fn(timeout)
+        except Exception as e:
+            # A request the provider answered with an error is not charged;
+            # one that timed out or was cut off may still have been served
+            if getattr(e, "status_code", None) is None:
+                bill(None)
+            raise
+        bill(response)
+        return response
+    return guarded_call(name, billed, deadline=deadline)
+
+
+def bill_completion(usage, messages, max_tokens):
+    if usage is None:
+        return None
+    return lambda response: usage.add_completion("gpt-4o-mini", response, messages, max_tokens)
+
+
+def wav_seconds(size, rate=audio_decode.TARGET_RATE):
+    # 16-bit mono after a 44-byte header
+    return max(0, size - 44) / (2 * rate)
+
+
+def chat_tokens(messages, max_tokens):
+    # Providers meter the prompt plus the most the reply may use
+    return sum(estimate_tokens(message["content"]) for message in messages) + max_tokens
+
+
+# Memories, transcripts and spilled sessions, on local disk unless
+# HIPPO_STORAGE_URL points every replica at shared storage
+def get_storage():
+    return _singleton("storage", lambda: open_storage(directories={
+        "memories": MEMORY_DIR,
+        "transcripts": TRANSCRIPT_DIR,
+        "sessions": session_budget.SPILL_DIR,
+    }))
+
+
+def reconcile_memory(stored, base, record):
+    """The record to store in place of `stored`.
+
+    `record` was built on top of `base`. If the stored record is no longer
+    `base`, another replica wrote in between, and its facts are kept too.
+    """
+    if stored is None or stored == base or stored == record:
+        return record
+    theirs = decode_memory(stored, "stored memory")
+    if theirs is None:
+        return record
+    merged = memory_model.decode(record)
+    merged.absorb(theirs)
+    return memory_model.encode(merged)
+
+
+def write_memory_record(key, item):
+    state, record = item
+    # Compare-and-set, so a concurrent write from another replica is merged
+    # rather than overwritten
+    written = get_storage().update(key, lambda stored: reconcile_memory(stored, state.stored, record))
+    state.stored = written
+
+
+# Memory writes happen on a background thread, batched and (on disk) fsynced
+def get_memory_writer():
+    return _singleton("memory_writer", lambda: WriteBehindWriter(write_fn=write_memory_record))
+
+
+# Extraction runs off the request path and several turns from the same user
+# share a single LLM call
+def get_extraction_queue():
+    return _singleton("extraction_queue", lambda: ExtractionQueue(extract_for_user, apply_extraction))
+
+
+# Provider usage and spend, per turn, session and user, with daily budgets
+def get_ledger():
+    return _singleton("ledger", Ledger)
+
+
+# Every turn is appended to a per-user log
+def get_transcript_store():
+    return _singleton("transcript_store", lambda: TranscriptStore(get_storage()))
+
+
+# Searchable archive of past turns, used for long-term recall
+def get_conversation_archive():
+    return _singleton("conversation_archive", ConversationArchive)
+
+
+# Shared replies to common questions, off unless HIPPO_RESPONSE_CACHE=1
+def get_response_cache():
+    return _singleton("response_cache", ResponseCache)
+
+
+# Decoding runs in worker processes so it never holds the UI's GIL
+def get_cpu_pool():
+    return _singleton("cpu_pool", CpuPool)
+
+
+# Turns run on a worker pool; front-ends submit them and poll for results
+def get_turn_jobs():
+    return _singleton("turn_jobs", lambda: JobQueue(run_turn_job, expected=(PipelineError,)))
+
+
+def start_warm_up():
+    warmup.start(OPENAI_API_KEY, ELEVENLABS_API_KEY, loaders=[
+        default_model, audio_decode.available, get_memory_writer, get_extraction_queue, get_ledger,
+        get_transcript_store, get_conversation_archive, get_consolidation_job, get_turn_jobs,
+        lambda: get_cpu_pool().warm(audio_decode.available),
+    ], after_ready=[
+        # Optional, and needs ElevenLabs: readiness must not wait for it
+        lambda: get_filler_library().ensure(),
+    ])
+
+
+def memory_key(user_id):
+    return f"memories/{user_key(user_id)}.mem"
+
+
+def save_memory(state):
+    # Encode now: the writer runs later, after further mutations
+    record = memory_model.encode(state.memory)
+    get_memory_writer().enqueue(memory_key(state.user_id), (state, record))
+    return record
+
+
+def decode_memory(record, source):
+    try:
+        return memory_model.decode(record)
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        logger.warning("Ignoring unreadable memory record %s: %s", source, e)
+        return None
+
+
+def load_memory_record(user_id):
+    """The user's memory and the stored record it was read from, if any."""
+    record = get_storage().get(memory_key(user_id))
+    memory = decode_memory(record, memory_key(user_id)) if record is not None else None
+    return (memory if memory is not None else memory_model.UserMemory()), record
+
+
+def load_memory(user_id):
+    return load_memory_record(user_id)[0]
+
+
+class MemoryState:
+    """One user's memories, shared between a session and background workers."""
+
+    def __init__(self, user_id, memory=None, record=None):
+        self.user_id = user_id
+        self.memory = memory if memory is not None else memory_model.UserMemory()
+        self.lock = threading.Lock()
+        # Bumped on every change so front-ends know when to re-render
+        self.version = 0
+        # The record of what is in self.memory, and the record last read
+        # from or written to storage; they differ while a write is queued
+        # or after a write merged in another replica's facts
+        self._record = record
+        self.stored = record
+        self._checked = time.monotonic()
+        self.last_used = time.monotonic()
+
+    def refresh(self, force=False):
+        """Pick up changes another replica made to shared storage."""
+        if not get_storage().shared or (not force and time.monotonic() - self._checked < MEMORY_REFRESH):
+            return
+        key = memory_key(self.user_id)
+        self._checked = time.monotonic()
+        # Our own write is queued or being made and is newer than storage
+        if get_memory_writer().is_pending(key):
+            return
+        local = self._record
+        record = get_storage().get(key)
+        if record is None or record == local:
+            return
+        memory = decode_memory(record, key)
+        if memory is None:
+            return
+        with self.lock:
+            # Changed locally while reading: what was read may be older
+            if self._record is not local or get_memory_writer().is_pending(key):
+                return
+            self.memory = memory
+            self._record = self.stored = record
+            self.version += 1
+
+    def update(self, extracted_data, source_turn=None):
+        # Merge into the latest stored facts, not a stale copy
+        self.refresh(force=True)
+        with self.lock:
+            if self.memory.merge(extracted_data, source_turn=source_turn):
+                self.version += 1
+                self._record = save_memory(self)
+            oversized = len(self.memory) > CONSOLIDATE_THRESHOLD
+        if oversized:
+            get_consolidation_job().request(self)
+
+    def consolidate(self):
+        # Summaries need an LLM call, so they are made without the lock and
+        # only applied if the field has not changed in the meantime
+        with self.lock:
+            # Fields over the cap, and fields where a newer fact may update
+            # or contradict an older one
+            conflicting = conflicting_fields(self.memory)
+            overfull = {
+                field: [fact.text for fact in bucket.values()]
+                for field, bucket in self.memory.facts.items()
+                if len(bucket) > MAX_FACTS_PER_FIELD or field in conflicting
+            }
+        usage = TurnUsage()
+        summaries = {field: (texts, summarize_facts(field, texts, usage)) for field, texts in overfull.items()}
+        get_ledger().record_usage(self.user_id, usage)
+        with self.lock:
+            if consolidate(self.memory, summaries=summaries):
+                self.version += 1
+                self._record = save_memory(self)
+
+    def snapshot(self):
+        with self.lock:
+            return self.memory.to_dict()
+
+    def context(self):
+        memories = self.snapshot()
+        # Retrieve stored memories
+        age = memories.get("age")
+        goals = ", ".join(memories.get("goals", []))
+        preferences = ", ".join(memories.get("preferences", []))
+        motivations = ", ".join(memories.get("motivations", []))
+        conditions = ", ".join(memories.get("health conditions", []))
+
+        # Construct memory summary for GPT
+        memory_context = "Here is what I remember about the user:\n"
+        if age:
+            memory_context += f"- Age: {age}\n"
+        if goals:
+            memory_context += f"- Goals: {goals}\n"
+        if preferences:
+            memory_context += f"- Preferences: {preferences}\n"
+        if motivations:
+            memory_context += f"- Motivations: {motivations}\n"
+        if conditions:
+            memory_context += f"- Health Conditions: {conditions}\n"
+
+        # Ensure memory context is empty if there is no stored data
+        if memory_context == "Here is what I remember about the user:\n":
+            memory_context = "The user has not shared any background information yet."
+        return memory_context
+
+
+# One MemoryState per user per process, shared by all of that user's sessions
+def get_memory(user_id):
+    state = _singleton(("memory", user_id), lambda: MemoryState(user_id, *load_memory_record(user_id)))
+    state.last_used = time.monotonic()
+    release_idle_memories()
+    return state
+
+
+_memory_sweep = {"last": time.monotonic(), "released": 0}
+
+
+def release_idle_memories(now=None):
+    # Runs on the request path, so only every so often
+    now = time.monotonic() if now is None else now
+    if now - _memory_sweep["last"] < MEMORY_IDLE / 10:
+        return
+    _memory_sweep["last"] = now
+    writer = get_memory_writer()
+    with _singletons_lock:
+        for name, state in list(_singletons.items()):
+            if (isinstance(state, MemoryState) and now - state.last_used > MEMORY_IDLE
+                    and not writer.is_pending(memory_key(state.user_id))):
+                del _singletons[name]
+                _memory_sweep["released"] += 1
+
+
+def memory_states():
+    with _singletons_lock:
+        return [state for name, state in _singletons.items() if isinstance(state, MemoryState)]
+
+
+# Expires, merges and caps stored facts so memories stay bounded over time
+def get_consolidation_job():
+    return _singleton("consolidation_job", lambda: ConsolidationJob(memory_states))
+
+
+def summarize_facts(field, texts, usage=None):
+    """Merge a field's facts into at most MAX_FACTS_PER_FIELD; [] on failure."""
+    import openai
+    facts = "\n".join(f"- {text}" for text in texts)
+    messages = [
+        {"role": "system", "content": f"These are a user's {field}, oldest first, as noted by their health coach. Merge duplicates, drop anything a later entry contradicts or supersedes, and return at most {MAX_FACTS_PER_FIELD} short facts."},
+        {"role": "user", "content": facts}
+    ]
+    try:
+        response = provider_call("openai", lambda timeout: get_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            max_tokens=200,
+            temperature=0,
+            response_format=response_format("fact_summary", FACT_SUMMARY_SCHEMA),
+            timeout=timeout
+        ), model="gpt-4o-mini", tokens=chat_tokens(messages, 200), priority=BACKGROUND,
+            bill=bill_completion(usage, messages, 200))
+        summary = json.loads(response.choices[0].message.content)["facts"]
+    except (json.JSONDecodeError, KeyError, openai.OpenAIError, CircuitOpenError, rate_limiter.RateLimited) as e:
+        # Consolidation then falls back to keeping the most used facts
+        logger.warning("Fact summarization failed: %s", e)
+        return []
+    return [text for text in summary if text.strip()][:MAX_FACTS_PER_FIELD]
+
+
+def extract_information(user_input, budget=None, usage=None):
+    import openai
+    messages = [
+        {"role": "system", "content": "Extract key user details. Leave a field null or empty when the user did not mention it."},
+        {"role": "user", "content": user_input}
+    ]
+    # Without a turn budget this is background work and yields to live turns
+    priority = INTERACTIVE if budget is not None else BACKGROUND
+    left = budget.stage_clock("extract") if budget is not None else lambda: None
+    try:
+        response = hedged_call("extract", lambda: provider_call("openai", lambda timeout: get_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            max_tokens=150,
+            temperature=0.5,
+            response_format=response_format("memory_delta", MEMORY_DELTA_SCHEMA),
+            timeout=timeout
+        ), model="gpt-4o-mini", tokens=chat_tokens(messages, 150), priority=priority, max_timeout=left(),
+            bill=bill_completion(usage, messages, 150)), budget=budget)
+        return json.loads(response.choices[0].message.content)
+    except (json.JSONDecodeError, openai.OpenAIError, CircuitOpenError, DeadlineExceeded, rate_limiter.RateLimited) as e:
+        # Extraction is best-effort: the turn goes on without new memories
+        logger.warning("Memory extraction failed: %s", e)
+        return empty_memory()
+
+
+# Background extraction for the queue, billed to the user it is for
+def extract_for_user(user_input, user_id):
+    usage = TurnUsage()
+    try:
+        return extract_information(user_input, usage=usage)
+    finally:
+        get_ledger().record_usage(user_id, usage)
+
+
+# Convert WebM to WAV using FFmpeg
+def convert_webm_to_wav_ffmpeg(webm_path, wav_path, max_seconds=audio_ingest.MAX_DURATION):
+    ffmpeg = warmup.ffmpeg_path()
+    if ffmpeg is None:
+        raise PipelineError("Audio conversion is unavailable: ffmpeg is not installed.")
+    # Decode a little past the limit, which is enough to tell it was exceeded
+    command = [
+        ffmpeg, "-y", "-i", webm_path, "-t", str(max_seconds + 1),
+        "-ac", "1", "-ar", str(audio_decode.TARGET_RATE), wav_path
+    ]
+    try:
+        guarded_call("ffmpeg", lambda timeout: subprocess.run(command, check=True, capture_output=True, timeout=timeout))
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, CircuitOpenError) as e:
+        raise PipelineError(f"FFmpeg conversion failed: {e}") from e
+    with wave.open(wav_path, "rb") as wav_file:
+        if wav_file.getnframes() > max_seconds * wav_file.getframerate():
+            raise IngestError(f"The recording is too long (limit {max_seconds:.0f}s).")
+
+
+# Decode in-process when PyAV is installed; the ffmpeg subprocess is the
+# fallback. Returns the decoded samples, or None after a fallback.
+def convert_webm_to_wav(webm_path, wav_path, max_seconds=audio_ingest.MAX_DURATION):
+    if audio_decode.available():
+        try:
+            return get_cpu_pool().run(audio_decode.decode_to_wav, webm_path, wav_path, max_seconds=max_seconds)
+        except audio_decode.AudioTooLong as e:
+            raise IngestError(f"The recording is too long (limit {max_seconds:.0f}s).") from e
+        except audio_decode.AudioDecodeError as e:
+            logger.warning("In-process decode failed, falling back to ffmpeg: %s", e)
+    convert_webm_to_wav_ffmpeg(webm_path, wav_path, max_seconds)
+    return None
+
+
+# Transcribe Audio with Whisper
+def transcribe_audio(audio_path, budget, samples=None, usage=None):
+    rate = audio_decode.TARGET_RATE
+    # Long recordings go out as concurrent chunks cut at pauses. After an
+    # ffmpeg fallback there are no samples in hand, so read the WAV back.
+    if samples is None and os.path.getsize(audio_path) > chunked_transcription.LONG_AUDIO_SECONDS * rate * 2:
+        if lazy_numpy.load() is not None:
+            samples, rate = chunked_transcription.read_wav(audio_path)
+    long_audio = chunked_transcription.is_long(samples, rate)
+    if long_audio:
+        chunked_transcription.reserve_time(budget, samples, rate)
+    # Every request, including hedges and queued chunks, ends with the stage
+    left = budget.stage_clock("transcribe")
+
+    # Whisper charges for the audio in every request, so overlapping chunks
+    # and a hedge's second upload are each paid for
+    def bill_seconds(size):
+        if usage is None:
+            return None
+        return lambda response: usage.add("openai", "whisper-1", "seconds", wav_seconds(size))
+
+    if long_audio:
+        def transcribe_chunk(chunk_file):
+            return provider_call("openai", lambda timeout: get_client().audio.transcriptions.create(
+                model="whisper-1",
+                file=chunk_file,
+                language="en",
+                response_format="text",
+                timeout=timeout
+            ), model="whisper-1", max_timeout=left(), bill=bill_seconds(len(chunk_file[1])))
+        return chunked_transcription.transcribe_chunked(samples, rate, transcribe_chunk, budget)
+
+    def request(timeout):
+        with open(audio_path, "rb") as audio_file:
+            return get_client().audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                language="en",
+                response_format="text",  # Force text output
+                timeout=timeout
+            )
+    bill = bill_seconds(os.path.getsize(audio_path))
+    return hedged_call(
+        "transcribe", lambda: provider_call("openai", request, model="whisper-1", max_timeout=left(), bill=bill),
+        budget=budget
+    )
+
+
+# Pull the few most relevant past exchanges into the prompt
+def recall_context(user_id, user_input):
+    recall = get_conversation_archive().recall_context(user_id, user_input)
+    return f"\n\n{recall}" if recall else ""
+
+
+# Generate Chatbot Response
+def get_completion(user_input, memory, recall, budget, usage=None, max_tokens=100):
+    memory_context = memory.context() + recall
+
+    # Construct messages for OpenAI API
+    messages = [
+        {"role": "system", "content": f"You are a friendly, helpful professional health coach. Keep replies short and avoid lists. Use this info to personalize your responses:\n\n{memory_context}"},
+        {"role": "user", "content": user_input}
+    ]
+    response = provider_call("openai", lambda timeout: get_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        max_tokens=max_tokens,
+        timeout=timeout
+    ), model="gpt-4o-mini", tokens=chat_tokens(messages, max_tokens), max_timeout=budget.stage_budget("complete"),
+        bill=bill_completion(usage, messages, max_tokens))
+    return response.choices[0].message.content
+
+
+# Reply allowance per budget mode: users near or over their daily budget
+# get shorter replies, whichever way the reply is generated
+def reply_tokens(budget_mode):
+    return 100 if budget_mode == cost_accounting.FULL else 60
+
+
+# The memory delta's share of a combined reply's tokens
+MEMORY_DELTA_TOKENS = 150
+
+
+# Generate the reply and the memory delta in one call
+def get_completion_with_memory(user_input, memory, recall, budget, usage=None, max_tokens=100 + MEMORY_DELTA_TOKENS):
+    memory_context = memory.context() + recall
+    messages = [
+        {"role": "system", "content": f"You are a friendly, helpful professional health coach. Keep replies short and avoid lists. Use this info to personalize your responses:\n\n{memory_context}\n\nAlso record in `memory` any new details the user shares about themselves; leave fields null or empty when there is nothing new."},
+        {"role": "user", "content": user_input}
+    ]
+    response = provider_call("openai", lambda timeout: get_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        max_tokens=max_tokens,
+        response_format=response_format("reply_with_memory", REPLY_WITH_MEMORY_SCHEMA),
+        timeout=timeout
+    ), model="gpt-4o-mini", tokens=chat_tokens(messages, max_tokens), max_timeout=budget.stage_budget("complete"),
+        bill=bill_completion(usage, messages, max_tokens))
+    message = response.choices[0].message
+    if message.refusal:
+        raise ValueError(f"Model refused: {message.refusal}")
+    result = json.loads(message.content)
+    return result["reply"], result["memory"]
+
+
+def extract_in_background(user_input, user_id, source_turn=None, trace=turn_trace.NULL_TRACE):
+    # New facts show up in the sidebar and the prompt from the next turn on
+    get_extraction_queue().submit(user_id, user_input, (source_turn, trace))
+
+
+def apply_extraction(user_id, extracted, sources, seconds):
+    # Into the user's one shared state, looked up now: the state the turn
+    # used may have been released while the batch waited. The batch's facts
+    # are attributed to its newest turn.
+    get_memory(user_id).update(extracted, sources[-1][0])
+    for _, trace in sources:
+        trace.record_extraction(extracted, seconds, len(sources))
+
+
+def extraction_pending(user_id):
+    return get_extraction_queue().is_pending(user_id)
+
+
+# Convert Text-to-Speech (TTS) using ElevenLabs; returns MP3 bytes
+def text_to_speech(text, budget, voice_id=VOICE_ID, usage=None):
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+    headers = {
+        "Content-Type": "application/json",
+        "xi-api-key": ELEVENLABS_API_KEY
+    }
+    payload = {
+        "text": text,
+        "voice_settings": {"stability": 0.8, "similarity_boost": 1.0}
+    }
+
+    def request(timeout):
+        response = warmup.http_session().post(url, json=payload, headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            raise ProviderError(f"{response.status_code}, {response.text}", response.status_code)
+        return response.content
+
+    def openai_request(timeout):
+        return get_client().audio.speech.create(model="tts-1", voice="alloy", input=text, timeout=timeout).content
+
+    # The hedge starts later, so each request takes what is left of the stage
+    left = budget.stage_clock("tts")
+
+    # Both providers charge for the characters of every request, so a hedge
+    # that also gets through is paid for twice
+    def bill_characters(provider, model):
+        if usage is None:
+            return None
+        return lambda response: usage.add(provider, model, "characters", len(text))
+
+    def elevenlabs():
+        return provider_call(
+            "elevenlabs", request, tokens=len(text), max_timeout=left(), bill=bill_characters("elevenlabs", None)
+        )
+
+    def openai_fallback():
+        return provider_call(
+            "openai", openai_request, model="tts-1", max_timeout=left(), bill=bill_characters("openai", "tts-1")
+        )
+
+    # Optionally hedge to OpenAI TTS instead of a second ElevenLabs request
+    fallback = openai_fallback if os.getenv("HIPPO_TTS_FALLBACK") == "openai" else None
+    try:
+        return hedged_call("tts", elevenlabs, fallback=fallback, budget=budget)
+    except Exception as e:
+        raise PipelineError(f"Error in TTS API call: {e}") from e
+
+
+# Filler clips are small and heard for a second, so they use ElevenLabs'
+# lowest bitrate
+FILLER_FORMAT = "mp3_22050_32"
+
+
+def synthesize_filler(text, voice_id=VOICE_ID):
+    def request(timeout):
+        response = warmup.http_session().post(
+            f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}",
+            params={"output_format": FILLER_FORMAT},
+            json={"text": text, "voice_settings": {"stability": 0.8, "similarity_boost": 1.0}},
+            headers={"Content-Type": "application/json", "xi-api-key": ELEVENLABS_API_KEY},
+            timeout=timeout
+        )
+        if response.status_code != 200:
+            raise ProviderError(f"{response.status_code}, {response.text}", response.status_code)
+        return response.content
+    # Every user hears the same clips, so they are billed to no one of them
+    usage = TurnUsage()
+    try:
+        return provider_call(
+            "elevenlabs", request, tokens=len(text), priority=BACKGROUND,
+            bill=lambda response: usage.add("elevenlabs", None, "characters", len(text))
+        )
+    finally:
+        get_ledger().record_usage(cost_accounting.SHARED_ACCOUNT, usage)
+
+
+# Acknowledgements played while a turn is processed, in the configured voice
+def get_filler_library():
+    return _singleton("filler_library", lambda: FillerLibrary(VOICE_ID, synthesize_filler))
+
+
+def run_turn(upload, user_id, memory, on_transcription=None, on_reply=None, session_id=None):
+    """Run one spoken turn end to end and return its result as a dict.
+
+    `upload` is a readable file-like object (or bytes) holding the recording.
+    `on_transcription` and `on_reply` are called as soon as each is known,
+    so a front-end can show progress. Raises PipelineError when the turn
+    cannot produce a reply; a failed synthesis only leaves `audio` empty.
+    """
+    budget = TurnBudget()
+    trace = turn_trace.start(user_id, budget)
+    usage = TurnUsage()
+    try:
+        return _run_turn(upload, user_id, memory, budget, trace, usage, on_transcription, on_reply)
+    except PipelineError as e:
+        trace.record(error=str(e))
+        raise
+    finally:
+        # Failed turns still cost whatever they got through
+        get_ledger().record_turn(user_id, usage, session_id)
+        trace.record(usage=usage.units)
+        trace.finish()
+
+
+def run_turn_job(job, upload, user_id, session_id=None, profile=False):
+    """Run a turn submitted to get_turn_jobs(), publishing its progress."""
+    with profiler.profile("turn", session_id, profile):
+        return run_turn(
+            upload, user_id, get_memory(user_id),
+            on_transcription=lambda text: job.progress.update(transcription=text),
+            on_reply=lambda text: job.progress.update(reply=text),
+            session_id=session_id
+        )
+
+
+def _run_turn(upload, user_id, memory, budget, trace, usage, on_transcription, on_reply):
+    import openai
+
+    turn_started = time.time()
+    # Users over their daily budget get shorter replies, then text only
+    budget_mode = get_ledger().mode(user_id)
+    # The user's last turn may have been served by another replica
+    memory.refresh()
+
+    # Each turn gets its own scratch files, so concurrent sessions in one
+    # process never overwrite each other's audio
+    with tempfile.TemporaryDirectory(prefix="hippo-turn-") as scratch:
+        webm_path = os.path.join(scratch, "user_input.webm")
+        wav_path = os.path.join(scratch, "user_input.wav")
+        if isinstance(upload, (bytes, bytearray)):
+            upload = io.BytesIO(upload)
+
+        # Bad uploads are turned away here, before any subprocess or API call
+        try:
+            with budget.stage("decode"):
+                container, seconds = audio_ingest.ingest(upload, webm_path)
+                samples = convert_webm_to_wav(webm_path, wav_path)
+        except IngestError as e:
+            raise PipelineError(str(e)) from e
+        if samples is not None:
+            seconds = len(samples) / audio_decode.TARGET_RATE
+        elif seconds is None:
+            seconds = wav_seconds(os.path.getsize(wav_path))
+        trace.record_audio(webm_path, container, seconds)
+
+        try:
+            with budget.stage("transcribe"):
+                transcription = transcribe_audio(wav_path, budget, samples, usage)
+        except (openai.OpenAIError, CircuitOpenError, DeadlineExceeded) as e:
+            raise PipelineError(f"Transcription failed: {e}") from e
+    trace.record(transcription=transcription)
+    if on_transcription:
+        on_transcription(transcription)
+
+    # Facts a regex can find are stored right away; the LLM is only asked
+    # when the local filter thinks there is something else to extract
+    local_info, needs_extraction = prefilter(transcription)
+    trace.record(local_facts=local_info, needs_extraction=needs_extraction)
+    if local_info:
+        memory.update(local_info, turn_started)
+
+    # Only general questions are answered from the shared cache: nothing
+    # personal to remember in the utterance, and no past turns recalled
+    response_cache = get_response_cache()
+    memories = memory.snapshot()
+    cacheable = not local_info and not needs_extraction and response_cache.cacheable(memories)
+    cached = None
+    cache_hit = False
+
+    try:
+        bot_response = None
+        with budget.stage("complete"):
+            if cacheable:
+                cached = response_cache.lookup(transcription, memories)
+            if cached is not None:
+                bot_response = cached.reply
+                cache_hit = True
+            else:
+                recall = recall_context(user_id, transcription)
+                cacheable = cacheable and not recall
+            if bot_response is None and COMBINED_REPLY and needs_extraction:
+                try:
+                    bot_response, extracted_info = get_completion_with_memory(
+                        transcription, memory, recall, budget, usage, reply_tokens(budget_mode) + MEMORY_DELTA_TOKENS
+                    )
+                    memory.update(extracted_info, turn_started)
+                    trace.record(extraction=extracted_info)
+                except (ValueError, KeyError) as e:
+                    # A truncated or refused structured reply; fall back to two calls
+                    logger.warning("Combined reply failed, falling back: %s", e)
+            if bot_response is None:
+                if needs_extraction:
+                    extract_in_background(transcription, user_id, turn_started, trace)
+                bot_response = get_completion(transcription, memory, recall, budget, usage, reply_tokens(budget_mode))
+                if cacheable:
+                    cached = response_cache.store(transcription, memories, bot_response)
+    except (openai.OpenAIError, CircuitOpenError, DeadlineExceeded, rate_limiter.RateLimited) as e:
+        raise PipelineError(f"The coach could not reply: {e}") from e
+    trace.record(reply=bot_response, cache_hit=cache_hit)
+    if on_reply:
+        on_reply(bot_response)
+
+    audio = cached.audio if cached is not None else None
+    tts_error = None
+    if audio is None and budget_mode != cost_accounting.TEXT_ONLY:
+        with budget.stage("tts"):
+            try:
+                audio = text_to_speech(bot_response, budget, usage=usage)
+            except PipelineError as e:
+                tts_error = str(e)
+        if cached is not None and audio is not None:
+            cached.audio = audio
+    trace.record(tts={"characters": len(bot_response), "bytes": len(audio) if audio else 0, "error": tts_error})
+
+    get_transcript_store().append(
+        user_id, transcription, bot_response,
+        latencies=budget.timings, started=turn_started
+    )
+    get_conversation_archive().add_turn(user_id, turn_started, transcription, bot_response)
+
+    return {
+        "transcription": transcription,
+        "reply": bot_response,
+        "audio": audio,
+        "tts_error": tts_error,
+        "timings": budget.timings,
+        "budget_mode": budget_mode,
+        "local_facts": local_info,
+        "needs_extraction": needs_extraction,
+        "cost": usage.cost(),
+    }
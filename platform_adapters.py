@@ -0,0 +1,122 @@
+import re
+
+# How each client platform plays the synthesized reply. The pipeline is the
+# same everywhere; only this last step differs.
+
+IOS_PLAYER = """
+    <div id="audio-container" style="padding: 20px; text-align: center; border-radius: 10px; background: #f5f5f5; margin: 10px 0;">
+        <div id="audio-status" style="margin-bottom: 15px; font-size: 16px;">
+            Tap the button below to play the audio response
+        </div>
+        <audio id="audio-player">
+            <source src="data:audio/mp3;base64,{b64_audio}" type="audio/mp3">
+        </audio>
+        <button id="play-button" 
+                style="padding: 12px 24px; 
+                       background-color: #4CAF50; 
+                       color: white; 
+                       border: none; 
+                       border-radius: 5px; 
+                       font-size: 16px; 
+                       cursor: pointer;">
+            Play Audio 🔊
+        </button>
+    </div>
+
+    <script>
+    document.addEventListener('DOMContentLoaded', function() {{
+        const audioPlayer = document.getElementById('audio-player');
+        const playButton = document.getElementById('play-button');
+        const statusDiv = document.getElementById('audio-status');
+        let isPlaying = false;
+
+        // Initialize audio
+        audioPlayer.load();
+
+        playButton.addEventListener('click', function() {{
+            if (!isPlaying) {{
+                // Try to play
+                const playPromise = audioPlayer.play();
+                
+                if (playPromise !== undefined) {{
+                    playPromise.then(() => {{
+                        isPlaying = true;
+                        playButton.textContent = 'Pause ⏸️';
+                        statusDiv.textContent = 'Playing audio response...';
+                        console.log('Audio playback started');
+                    }}).catch(error => {{
+                        console.error('Playback failed:', error);
+                        statusDiv.textContent = 'Playback failed. Please try again.';
+                    }});
+                }}
+            }} else {{
+                audioPlayer.pause();
+                isPlaying = false;
+                playButton.textContent = 'Play Audio 🔊';
+                statusDiv.textContent = 'Audio paused. Tap to resume.';
+            }}
+        }});
+
+        // Handle audio ending
+        audioPlayer.addEventListener('ended', function() {{
+            isPlaying = false;
+            playButton.textContent = 'Play Again 🔄';
+            statusDiv.textContent = 'Audio finished. Tap to replay.';
+        }});
+
+        // Handle audio errors
+        audioPlayer.addEventListener('error', function(e) {{
+            console.error('Audio error:', e);
+            statusDiv.textContent = 'Error playing audio. Please try again.';
+            playButton.textContent = 'Retry 🔄';
+        }});
+    }});
+    </script>
+"""
+
+ANDROID_PLAYER = """
+    <audio id='tts-audio' autoplay>
+        <source src='data:audio/mp3;base64,{b64_audio}' type='audio/mp3'>
+        Your browser does not support the audio element.
+    </audio>
+    <script>
+        var audio = document.getElementById('tts-audio');
+        audio.play();
+    </script>
+"""
+
+
+class PlaybackAdapter:
+    def __init__(self, name, template, height=None):
+        self.name = name
+        self.template = template
+        self.height = height
+
+    def audio_html(self, b64_audio):
+        return self.template.format(b64_audio=b64_audio)
+
+
+# iOS Safari refuses to autoplay, so it gets a tap-to-play button
+PLATFORMS = {
+    "ios": PlaybackAdapter("ios", IOS_PLAYER, height=150),
+    "android": PlaybackAdapter("android", ANDROID_PLAYER),
+}
+
+# The tap-to-play player works everywhere, so unknown clients get that one
+DEFAULT_PLATFORM = "ios"
+
+_IOS_AGENT = re.compile(r"iPhone|iPad|iPod", re.I)
+_ANDROID_AGENT = re.compile(r"Android", re.I)
+
+
+def detect_platform(user_agent):
+    user_agent = user_agent or ""
+    if _IOS_AGENT.search(user_agent):
+        return "ios"
+    if _ANDROID_AGENT.search(user_agent):
+        return "android"
+    return DEFAULT_PLATFORM
+
+
+def get_adapter(platform):
+    return PLATFORMS.get(platform, PLATFORMS[DEFAULT_PLATFORM])
@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import random
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Opt-in sampling profiler for script runs and pipeline stages. Stacks are
+# written in the collapsed ("folded") format that flamegraph.pl and
+# speedscope read, one file per session. When no profile is active the
+# hooks cost a single attribute check.
+ENABLED = os.getenv("HIPPO_PROFILE", "0") == "1"
+# Allow ?profile=1 to turn it on for one session
+ALLOW_QUERY = os.getenv("HIPPO_PROFILE_QUERY", "0") == "1"
+# Share of runs profiled when enabled, so it can stay on in production
+SAMPLE_RATE = float(os.getenv("HIPPO_PROFILE_SAMPLE", "0.01"))
+INTERVAL = float(os.getenv("HIPPO_PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.getenv("HIPPO_PROFILE_DIR", "profiles")
+
+_lock = threading.Lock()
+# thread id -> active Profile
+_active = {}
+_sampler = None
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    def __init__(self, name, session_id, thread_id):
+        self.name = name
+        self.session_id = session_id
+        self.thread_id = thread_id
+        self.stage = None
+        self.stacks = {}
+        self.samples = 0
+
+    def sample(self, frame):
+        names = []
+        while frame is not None:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        if self.stage:
+            names.append(f"stage:{self.stage}")
+        names.append(self.name)
+        stack = ";".join(reversed(names))
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    def write(self, directory=PROFILE_DIR):
+        if not self.stacks:
+            return
+        os.makedirs(directory, exist_ok=True)
+        # Appending is fine: folded-stack readers sum repeated stacks
+        with open(os.path.join(directory, f"{self.session_id}.folded"), "a") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+
+
+def _sample_loop():
+    global _sampler
+    me = threading.get_ident()
+    while True:
+        time.sleep(INTERVAL)
+        with _lock:
+            if not _active:
+                _sampler = None
+                return
+            frames = sys._current_frames()
+            for thread_id, profile in _active.items():
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != me:
+                    profile.sample(frame)
+
+
+def should_profile(query_flag=False):
+    if ALLOW_QUERY and query_flag:
+        return True
+    return ENABLED and random.random() < SAMPLE_RATE
+
+
+@contextmanager
+def _profile(name, session_id):
+    global _sampler
+    thread_id = threading.get_ident()
+    profile = Profile(name, session_id, thread_id)
+    with _lock:
+        _active[thread_id] = profile
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="profiler", daemon=True)
+            _sampler.start()
+    try:
+        yield profile
+    finally:
+        with _lock:
+            _active.pop(thread_id, None)
+        profile.write()
+
+
+def profile(name, session_id, enabled):
+    """Sample the calling thread for the duration of the block."""
+    if not enabled or threading.get_ident() in _active:
+        return nullcontext()
+    return _profile(name, session_id)
+
+
+@contextmanager
+def _stage(profile_, name):
+    previous = profile_.stage
+    profile_.stage = name
+    try:
+        yield
+    finally:
+        profile_.stage = previous
+
+
+def stage(name):
+    """Label samples taken inside the block with a pipeline stage."""
+    if not _active:
+        return nullcontext()
+    profile_ = _active.get(threading.get_ident())
+    if profile_ is None:
+        return nullcontext()
+    return _stage(profile_, name)
@@ -0,0 +1,240 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Provider calls draw from per-provider, per-model token buckets: one for
+# requests and, where the provider meters them, one for tokens (or
+# characters). User-facing calls are scheduled ahead of background work.
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Background calls leave this share of each bucket to interactive ones
+INTERACTIVE_RESERVE = float(os.getenv("HIPPO_RATE_RESERVE", "0.2"))
+# An interactive call waits at most this long for capacity and then goes
+# ahead anyway; the overdraft is paid back out of background capacity.
+INTERACTIVE_MAX_WAIT = float(os.getenv("HIPPO_RATE_MAX_WAIT", "2.0"))
+# A background call gives up with RateLimited after waiting this long, so a
+# backlog cannot stall the worker thread it runs on indefinitely
+BACKGROUND_MAX_WAIT = float(os.getenv("HIPPO_RATE_BACKGROUND_WAIT", "60"))
+# Set to share the buckets between replicas (needs the redis package)
+REDIS_URL = os.getenv("HIPPO_REDIS_URL")
+
+
+def _limit(name, unit, default):
+    value = os.getenv(f"HIPPO_RATE_{name}_{unit}")
+    return float(value) if value else default
+
+
+# (provider, model) -> (requests per minute, tokens per minute or None)
+LIMITS = {
+    ("openai", "gpt-4o-mini"): (_limit("GPT_4O_MINI", "RPM", 500), _limit("GPT_4O_MINI", "TPM", 200000)),
+    ("openai", "whisper-1"): (_limit("WHISPER", "RPM", 50), None),
+    ("openai", "tts-1"): (_limit("OPENAI_TTS", "RPM", 50), None),
+    # ElevenLabs meters characters rather than tokens
+    ("elevenlabs", None): (_limit("ELEVENLABS", "RPM", 100), _limit("ELEVENLABS", "CPM", 40000)),
+}
+
+
+class RateLimited(Exception):
+    pass
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute`, holding at most one minute's worth."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost, floor):
+        # Seconds until `cost` can be taken while leaving `floor` behind
+        short = cost + floor - self.level
+        return 0.0 if short <= 0 else short / self.rate
+
+
+class LocalLimiter:
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, per_minute):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(per_minute)
+        return bucket
+
+    def try_take(self, key, limits, costs, reserve, force):
+        """Take `costs` from each bucket, or return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            buckets = []
+            wait = 0.0
+            for index, (per_minute, cost) in enumerate(zip(limits, costs)):
+                if per_minute is None or not cost:
+                    continue
+                bucket = self._bucket((key, index), per_minute)
+                bucket.refill(now)
+                buckets.append((bucket, cost))
+                wait = max(wait, bucket.wait_time(cost, bucket.capacity * reserve))
+            if wait and not force:
+                return wait
+            for bucket, cost in buckets:
+                bucket.level -= cost
+            return 0.0
+
+
+# Same algorithm as TokenBucket, run atomically inside Redis for every
+# bucket of a call. KEYS are the buckets; ARGV is now, reserve, force and
+# then a (per_minute, cost) pair per key.
+_REDIS_TAKE = """
+local now = tonumber(ARGV[1])
+local reserve = tonumber(ARGV[2])
+local force = ARGV[3] == "1"
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local per_minute = tonumber(ARGV[2 + i * 2])
+    local cost = tonumber(ARGV[3 + i * 2])
+    local state = redis.call("HMGET", key, "level", "updated")
+    local level = tonumber(state[1]) or per_minute
+    local updated = tonumber(state[2]) or now
+    level = math.min(per_minute, level + (now - updated) * per_minute / 60)
+    levels[i] = level
+    local short = cost + per_minute * reserve - level
+    if short > 0 then
+        wait = math.max(wait, short * 60 / per_minute)
+    end
+end
+if wait > 0 and not force then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local cost = tonumber(ARGV[3 + i * 2])
+    redis.call("HSET", key, "level", levels[i] - cost, "updated", now)
+    redis.call("EXPIRE", key, 120)
+end
+return "0"
+"""
+
+
+class RedisLimiter:
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(_REDIS_TAKE)
+
+    def try_take(self, key, limits, costs, reserve, force):
+        keys = []
+        args = [time.time(), reserve, "1" if force else "0"]
+        for index, (per_minute, cost) in enumerate(zip(limits, costs)):
+            if per_minute is None or not cost:
+                continue
+            keys.append(f"hippo:rate:{key[0]}:{key[1]}:{index}")
+            args += [per_minute, cost]
+        return float(self._take(keys=keys, args=args))
+
+
+class Scheduler:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self._cond = threading.Condition()
+        # Interactive calls currently waiting; background calls yield to them
+        self._interactive_waiting = 0
+        self.granted = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.waited = {INTERACTIVE: 0.0, BACKGROUND: 0.0}
+        self.overdrafts = 0
+
+    def acquire(self, provider, model=None, tokens=0, priority=INTERACTIVE, timeout=None):
+        """Block until the call may go ahead.
+
+        Interactive calls wait at most INTERACTIVE_MAX_WAIT (or `timeout`)
+        and then proceed regardless. Background calls wait for spare
+        capacity for up to `timeout` seconds (BACKGROUND_MAX_WAIT if None)
+        and then raise RateLimited. A call bigger than its bucket can ever
+        hold raises RateLimited straight away.
+        """
+        key = (provider, model)
+        limits = LIMITS.get(key)
+        if limits is None:
+            return
+        costs = (1, tokens)
+        interactive = priority == INTERACTIVE
+        reserve = 0.0 if interactive else INTERACTIVE_RESERVE
+        for per_minute, cost in zip(limits, costs):
+            if per_minute is not None and cost > per_minute * (1 - reserve):
+                raise RateLimited(f"{provider} call of {cost} exceeds the limit of {per_minute:.0f} per minute")
+        if interactive:
+            max_wait = INTERACTIVE_MAX_WAIT if timeout is None else min(timeout, INTERACTIVE_MAX_WAIT)
+        else:
+            max_wait = BACKGROUND_MAX_WAIT if timeout is None else timeout
+        start = time.monotonic()
+        if interactive:
+            with self._cond:
+                self._interactive_waiting += 1
+        try:
+            while True:
+                waited = time.monotonic() - start
+                # The limiter may be a network round trip (Redis), so it is
+                # asked without holding the lock; the lock is only for
+                # waiting and being woken
+                if interactive:
+                    wait = self.limiter.try_take(key, limits, costs, reserve, waited >= max_wait)
+                elif self._interactive_waiting:
+                    wait = 0.1
+                else:
+                    wait = self.limiter.try_take(key, limits, costs, reserve, False)
+                if wait == 0.0:
+                    with self._cond:
+                        if interactive and waited >= max_wait:
+                            self.overdrafts += 1
+                        self.granted[priority] += 1
+                        self.waited[priority] += waited
+                    return
+                remaining = max_wait - waited
+                if remaining <= 0:
+                    raise RateLimited(f"No {provider} capacity for a background call")
+                with self._cond:
+                    self._cond.wait(min(wait, remaining))
+        finally:
+            if interactive:
+                with self._cond:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def snapshot(self):
+        return {
+            "interactive_calls": self.granted[INTERACTIVE],
+            "background_calls": self.granted[BACKGROUND],
+            "interactive_wait": round(self.waited[INTERACTIVE], 2),
+            "background_wait": round(self.waited[BACKGROUND], 2),
+            "overdrafts": self.overdrafts,
+        }
+
+
+def _make_scheduler():
+    if REDIS_URL:
+        try:
+            return Scheduler(RedisLimiter(REDIS_URL))
+        except ImportError:
+            logger.warning("HIPPO_REDIS_URL is set but redis is not installed; rate limits are per process")
+    return Scheduler(LocalLimiter())
+
+
+_scheduler = _make_scheduler()
+
+
+def acquire(provider, model=None, tokens=0, priority=INTERACTIVE, timeout=None):
+    _scheduler.acquire(provider, model, tokens, priority, timeout)
+
+
+def snapshot():
+    return _scheduler.snapshot()
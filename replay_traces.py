@@ -0,0 +1,159 @@
+"""Replay recorded turn traces through the pipeline against stand-in providers.
+
+Every trace written with HIPPO_TRACE=1 is played back through run_turn.
+Upload, decode, filtering, memory, recall and persistence run for real,
+on silent audio of the recorded length and with scratch storage. The
+transcription, completion and speech providers, and the background
+extraction call, are replaced by stand-ins that return the recorded outputs
+after the recorded latencies; the extraction queue and the memory updates
+it makes run for real. Recorded and replayed stage timings are printed side
+by side, along with how often the local pre-filter now decides differently.
+
+    python replay_traces.py traces/*.jsonl.gz [--speed 1.0] [--limit N]
+"""
+import os
+import io
+import sys
+import time
+import wave
+import argparse
+import tempfile
+
+
+def silent_wav(seconds, rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b"\0\0" * int(seconds * rate))
+    return buffer.getvalue()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)] if values else None
+
+
+class StandIns:
+    """Recorded provider behaviour for the trace being replayed."""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.trace = None
+        # user -> recorded background extractions of turns replayed so far
+        self.extractions = {}
+        self.extracted = 0
+
+    def _wait(self, stage):
+        time.sleep(self.trace.get("timings", {}).get(stage, 0.0) * self.speed)
+
+    def transcribe_audio(self, audio_path, budget, samples=None, usage=None):
+        self._wait("transcribe")
+        return self.trace.get("transcription", "")
+
+    def get_completion(self, user_input, memory, recall, budget, usage=None, max_tokens=100):
+        self._wait("complete")
+        return self.trace.get("reply", "")
+
+    def get_completion_with_memory(self, user_input, memory, recall, budget, usage=None, max_tokens=250):
+        self._wait("complete")
+        return self.trace.get("reply", ""), self.trace.get("extraction") or {}
+
+    def text_to_speech(self, text, budget, voice_id=None, usage=None):
+        self._wait("tts")
+        tts = self.trace.get("tts") or {}
+        return b"\0" * tts.get("bytes", 0)
+
+    def extract_for_user(self, user_input, user_id):
+        # The queue may batch turns differently than it did when recorded;
+        # a batch returns what was recorded for all of its turns
+        records = self.extractions.pop(user_id, [])
+        if not records:
+            return {}
+        time.sleep(max(record["seconds"] for record in records) * self.speed)
+        self.extracted += 1
+        merged = {}
+        for record in records:
+            for field, value in (record.get("extraction") or {}).items():
+                if isinstance(value, list):
+                    merged[field] = merged.get(field, []) + [v for v in value if v not in merged.get(field, [])]
+                elif value is not None:
+                    merged[field] = value
+        return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("traces", nargs="+")
+    parser.add_argument("--speed", type=float, default=1.0, help="Scale recorded provider latencies")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="hippo-replay-")
+    # Keep replayed turns out of the real stores, and do not trace them again
+    os.environ.update({
+        "HIPPO_TRACE": "0",
+        "HIPPO_STORAGE_URL": "local://",
+        "HIPPO_ARCHIVE_DB": os.path.join(scratch, "conversations.db"),
+        "HIPPO_USAGE_DIR": os.path.join(scratch, "usage"),
+        "HIPPO_USER_DAILY_BUDGET": "0",
+        "HIPPO_RESPONSE_CACHE": "0",
+    })
+    import pipeline
+    import turn_trace
+
+    stand_ins = StandIns(args.speed)
+    for name in ("transcribe_audio", "get_completion", "get_completion_with_memory", "text_to_speech", "extract_for_user"):
+        setattr(pipeline, name, getattr(stand_ins, name))
+
+    records = list(turn_trace.load(args.traces))
+    # Background extractions are written when they finish, as records of
+    # their own naming the turn
+    extractions = {
+        (record["user"], record["turn"]): record for record in records if record.get("kind") == "extraction"
+    }
+    recorded = {}
+    replayed = {}
+    count = 0
+    prefilter_changed = 0
+    for trace in records:
+        if args.limit is not None and count >= args.limit:
+            break
+        if "kind" in trace or "error" in trace or "transcription" not in trace:
+            continue
+        stand_ins.trace = trace
+        seconds = (trace.get("audio") or {}).get("seconds") or 5.0
+        user_id = trace["user"]
+        extraction = extractions.get((user_id, trace["started"]))
+        if extraction is not None:
+            stand_ins.extractions.setdefault(user_id, []).append(extraction)
+        try:
+            result = pipeline.run_turn(silent_wav(seconds), user_id, pipeline.get_memory(user_id))
+        except pipeline.PipelineError as e:
+            print(f"trace at {trace['started']:.0f} failed on replay: {e}", file=sys.stderr)
+            continue
+        for stage, value in trace.get("timings", {}).items():
+            recorded.setdefault(stage, []).append(value)
+        for stage, value in result["timings"].items():
+            replayed.setdefault(stage, []).append(value)
+        if "needs_extraction" in trace and (
+            result["local_facts"] != trace.get("local_facts") or result["needs_extraction"] != trace["needs_extraction"]
+        ):
+            prefilter_changed += 1
+        count += 1
+    pipeline.get_extraction_queue().flush()
+
+    print(f"replayed {count} turns")
+    print(f"pre-filter decided differently on {prefilter_changed} turns")
+    print(f"background extractions: recorded for {len(extractions)} turns, replayed in {stand_ins.extracted} calls")
+    print(f"{'stage':<12}{'rec p50':>10}{'rep p50':>10}{'rec p95':>10}{'rep p95':>10}")
+    for stage in sorted(set(recorded) | set(replayed)):
+        row = [percentile(recorded.get(stage, []), p) for p in (50, 95)]
+        row += [percentile(replayed.get(stage, []), p) for p in (50, 95)]
+        cells = ["-" if v is None else f"{v * 1000:.0f}ms" for v in (row[0], row[2], row[1], row[3])]
+        print(f"{stage:<12}" + "".join(f"{cell:>10}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
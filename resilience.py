@@ -0,0 +1,209 @@
+import os
+import time
+import random
+import threading
+import subprocess
+
+from hedging import LatencyTracker, DeadlineExceeded
+
+FAILURE_THRESHOLD = int(os.getenv("HIPPO_BREAKER_FAILURES", "5"))
+RESET_TIMEOUT = float(os.getenv("HIPPO_BREAKER_RESET", "30"))
+MAX_RETRIES = int(os.getenv("HIPPO_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("HIPPO_BACKOFF_BASE", "0.2"))
+BACKOFF_MAX = float(os.getenv("HIPPO_BACKOFF_MAX", "2.0"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_retryable_types = None
+
+
+def retryable_types():
+    # Resolved on first use so importing this module does not pull in the
+    # provider SDKs before the first page has been drawn
+    global _retryable_types
+    if _retryable_types is None:
+        types = (TimeoutError, ConnectionError, subprocess.TimeoutExpired)
+        try:
+            import requests
+            types += (requests.Timeout, requests.ConnectionError)
+        except ImportError:
+            pass
+        try:
+            import openai
+            types += (openai.APITimeoutError, openai.APIConnectionError)
+        except ImportError:
+            pass
+        _retryable_types = types
+    return _retryable_types
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class ProviderError(Exception):
+    """A failed provider response that carries its HTTP status."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_retryable(error):
+    if isinstance(error, retryable_types()):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                # Let a single probe through; everyone else fails fast.
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_client_error(self):
+        # The provider answered, it just refused this request (bad input,
+        # auth): that says nothing about its health, for anyone else
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+
+class Dependency:
+    def __init__(self, name, min_timeout, max_timeout, multiplier=3.0):
+        self.name = name
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.multiplier = multiplier
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.retries = 0
+
+    def timeout(self):
+        # Adapt to what the dependency has actually been doing: a multiple of
+        # the observed p99, clamped so a slow warm-up does not stick.
+        p99 = self.latency.percentile(99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.multiplier))
+
+
+DEPENDENCIES = {
+    "openai": Dependency("openai", min_timeout=5.0, max_timeout=30.0),
+    "elevenlabs": Dependency("elevenlabs", min_timeout=5.0, max_timeout=30.0),
+    "ffmpeg": Dependency("ffmpeg", min_timeout=3.0, max_timeout=20.0),
+}
+
+
+def guarded_call(name, fn, max_timeout=None, retries=MAX_RETRIES, deadline=None):
+    """Call `fn(timeout)` behind the named dependency's breaker.
+
+    Retryable errors are retried with jittered exponential backoff; anything
+    else, or running out of retries, is raised to the caller. All attempts
+    and backoff together finish by `deadline` (a time.monotonic() value),
+    or within `max_timeout` seconds of the call; no retry is started once
+    that has passed. Only retryable (transient or server-side) failures
+    count towards opening the breaker.
+    """
+    dep = DEPENDENCIES[name]
+    if deadline is None and max_timeout is not None:
+        deadline = time.monotonic() + max_timeout
+    attempt = 0
+    while True:
+        timeout = dep.timeout()
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"No time left to call {name}")
+            timeout = min(timeout, remaining)
+        if not dep.breaker.allow():
+            dep.rejected += 1
+            raise CircuitOpenError(f"{name} is unavailable (circuit open)")
+        dep.calls += 1
+        start = time.monotonic()
+        try:
+            result = fn(timeout)
+        except Exception as e:
+            dep.errors += 1
+            if not is_retryable(e):
+                dep.breaker.record_client_error()
+                raise
+            dep.breaker.record_failure()
+            if attempt >= retries:
+                raise
+            attempt += 1
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            # A retry that could not start before the deadline is not worth
+            # the wait; the caller gets the real error instead
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            dep.retries += 1
+            time.sleep(delay)
+            continue
+        dep.latency.record(time.monotonic() - start)
+        dep.breaker.record_success()
+        return result
+
+
+def is_available(name):
+    return not DEPENDENCIES[name].breaker.is_open()
+
+
+def snapshot():
+    metrics = {}
+    for name, dep in DEPENDENCIES.items():
+        metrics[name] = {
+            "state": dep.breaker.state,
+            "timeout": round(dep.timeout(), 2),
+            "p50": dep.latency.percentile(50),
+            "p99": dep.latency.percentile(99),
+            "calls": dep.calls,
+            "errors": dep.errors,
+            "retries": dep.retries,
+            "rejected": dep.rejected,
+        }
+    return metrics
@@ -0,0 +1,142 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import lazy_numpy
+from conversation_archive import embed_tokens
+from extraction_filter import tokenize
+
+# Replies (and their audio) to questions many users ask in nearly the same
+# words, reused across users whose relevant memories match. Off unless
+# HIPPO_RESPONSE_CACHE=1; needs NumPy for the utterance embeddings.
+ENABLED = os.getenv("HIPPO_RESPONSE_CACHE", "0") == "1"
+SIMILARITY = float(os.getenv("HIPPO_CACHE_SIMILARITY", "0.9"))
+TTL = float(os.getenv("HIPPO_CACHE_TTL", "86400"))
+MAX_ENTRIES = int(os.getenv("HIPPO_CACHE_SIZE", "2000"))
+# The memory fields a general answer can depend on; health conditions are
+# handled by never using the cache at all
+FINGERPRINT_FIELDS = ["age", "goals", "preferences", "motivations"]
+# Only filler is dropped before embedding. Recall's stopword list also drops
+# question words, which would make "when", "why" and "how" questions about
+# the same thing look identical.
+FILLER_WORDS = set("a an the is are am be to of it its it's this that so um uh".split())
+# Questions only match if they share all of these, whatever the similarity
+MARKER_WORDS = set("""
+how what when where which who whom whose why whether if can can't could couldn't should shouldn't
+would wouldn't will won't do don't does doesn't did didn't isn't aren't no not never nor
+without before after
+""".split())
+
+
+def utterance_tokens(utterance):
+    return [t for t in tokenize(utterance) if t not in FILLER_WORDS]
+
+
+def memory_fingerprint(memories):
+    parts = []
+    for field in FINGERPRINT_FIELDS:
+        value = memories.get(field)
+        values = sorted(str(v).lower() for v in value) if isinstance(value, list) else [str(value or "")]
+        parts.append(f"{field}={'|'.join(values)}")
+    return hashlib.sha1(";".join(parts).encode()).hexdigest()
+
+
+class CacheEntry:
+    __slots__ = ("key", "fingerprint", "vector", "markers", "reply", "audio", "created")
+
+    def __init__(self, key, fingerprint, vector, markers, reply, created):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.vector = vector
+        self.markers = markers
+        self.reply = reply
+        self.audio = None
+        self.created = created
+
+
+class ResponseCache:
+    def __init__(self, enabled=ENABLED, similarity=SIMILARITY, ttl=TTL, max_entries=MAX_ENTRIES):
+        # Only an enabled cache imports NumPy
+        self.enabled = enabled and lazy_numpy.load() is not None
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> entry, least recently used first
+        self._entries = OrderedDict()
+        # fingerprint -> keys of its entries, the only ones a lookup compares
+        self._by_fingerprint = {}
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def cacheable(self, memories):
+        if not self.enabled:
+            return False
+        # Advice for someone with a health condition has to be their own
+        if memories.get("health conditions"):
+            self.bypasses += 1
+            return False
+        return True
+
+    def _remove(self, entry):
+        del self._entries[entry.key]
+        keys = self._by_fingerprint[entry.fingerprint]
+        keys.remove(entry.key)
+        if not keys:
+            del self._by_fingerprint[entry.fingerprint]
+
+    def lookup(self, utterance, memories):
+        fingerprint = memory_fingerprint(memories)
+        tokens = utterance_tokens(utterance)
+        vector = embed_tokens(tokens)
+        markers = MARKER_WORDS.intersection(tokens)
+        now = time.time()
+        best, best_score = None, self.similarity
+        with self._lock:
+            for key in list(self._by_fingerprint.get(fingerprint, ())):
+                entry = self._entries[key]
+                if now - entry.created > self.ttl:
+                    self._remove(entry)
+                    continue
+                if entry.markers != markers:
+                    continue
+                score = float(entry.vector @ vector)
+                if score >= best_score:
+                    best, best_score = entry, score
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best.key)
+            self.hits += 1
+            return best
+
+    def store(self, utterance, memories, reply):
+        tokens = utterance_tokens(utterance)
+        vector = embed_tokens(tokens)
+        if not vector.any():
+            return None
+        with self._lock:
+            entry = CacheEntry(
+                self._next_key, memory_fingerprint(memories), vector, MARKER_WORDS.intersection(tokens), reply, time.time()
+            )
+            self._next_key += 1
+            self._entries[entry.key] = entry
+            self._by_fingerprint.setdefault(entry.fingerprint, []).append(entry.key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries.values())))
+        return entry
+
+    def snapshot(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
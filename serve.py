@@ -0,0 +1,26 @@
+"""Server entry point: warm the process up, then serve the app.
+
+Streamlit only runs the app script when the first browser connects, so
+anything started from the script waits for a visitor, and so does the
+ready file that health checks look at. This starts warming up at process
+start and then hands over to Streamlit in the same process, which reuses
+the warm pipeline when it runs the script.
+
+    python serve.py [app.py] [streamlit options, e.g. --server.port=8501]
+"""
+import sys
+
+import pipeline
+
+
+def main():
+    args = sys.argv[1:]
+    script = args.pop(0) if args and args[0].endswith(".py") else "app.py"
+    pipeline.start_warm_up()
+    from streamlit.web import cli
+    sys.argv = ["streamlit", "run", script, *args]
+    return cli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import resource
+import threading
+
+from storage import FileStorage
+
+logger = logging.getLogger(__name__)
+
+# Heavy per-session values (the last turn, rendered sidebar HTML) live here
+# rather than in st.session_state, so they can be measured, trimmed to a
+# per-session budget, and spilled to storage while a tab sits idle. With
+# shared storage a session can be picked up again by any replica.
+SESSION_BUDGET = int(os.getenv("HIPPO_SESSION_BUDGET_KB", "256")) * 1024
+IDLE_SECONDS = float(os.getenv("HIPPO_SESSION_IDLE", "300"))
+# Spilled sessions not seen again for this long are deleted
+EXPIRE_SECONDS = float(os.getenv("HIPPO_SESSION_EXPIRE", "86400"))
+SWEEP_INTERVAL = float(os.getenv("HIPPO_SESSION_SWEEP", "60"))
+SPILL_DIR = os.getenv("HIPPO_SESSION_SPILL_DIR", "sessions")
+
+
+def approx_size(value):
+    """Rough retained size of JSON-like data; strings and bytes dominate."""
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class SessionArtifacts:
+    def __init__(self, session_id, registry):
+        self.session_id = session_id
+        self.registry = registry
+        # key -> (value, size, evictable)
+        self._items = {}
+        self.bytes = 0
+        self.last_seen = time.monotonic()
+        # New here, but maybe spilled earlier or by another replica
+        self.spilled = True
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def touch(self):
+        with self._lock:
+            self.last_seen = time.monotonic()
+            if self.spilled:
+                self._rehydrate()
+
+    def get(self, key, default=None):
+        self.touch()
+        with self._lock:
+            item = self._items.get(key)
+        return default if item is None else item[0]
+
+    def peek(self, key):
+        """Read a value without counting as activity; None once spilled."""
+        with self._lock:
+            item = self._items.get(key)
+        return None if item is None else item[0]
+
+    def set(self, key, value, evictable=False, activity=True):
+        """Keep `value`; evictable values may be dropped to stay in budget.
+
+        Background refreshes pass activity=False, so an open but unused tab
+        still goes idle; they are not kept while the session is spilled.
+        """
+        if activity:
+            self.touch()
+        elif self.spilled:
+            return
+        size = approx_size(value)
+        with self._lock:
+            old = self._items.get(key)
+            self.bytes += size - (old[1] if old else 0)
+            self._items[key] = (value, size, evictable)
+            self._trim()
+            if not evictable and self.registry.storage.shared:
+                # Write through so another replica can take the session over
+                self._store()
+        self.registry.observe()
+
+    def pop(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self.bytes -= item[1]
+        return None if item is None else item[0]
+
+    def _trim(self):
+        if self.bytes <= SESSION_BUDGET:
+            return
+        for key, (_, size, evictable) in sorted(self._items.items(), key=lambda item: -item[1][1]):
+            if self.bytes <= SESSION_BUDGET:
+                break
+            if evictable:
+                del self._items[key]
+                self.bytes -= size
+                self.evictions += 1
+
+    def storage_key(self):
+        return f"sessions/{self.session_id}.json"
+
+    def _store(self):
+        # Evictable values can be rebuilt and are not worth storing
+        keep = {key: value for key, (value, _, evictable) in self._items.items() if not evictable}
+        self.registry.storage.put(self.storage_key(), json.dumps(keep).encode())
+
+    def spill(self):
+        with self._lock:
+            if self.spilled or not self._items:
+                return 0
+            self._store()
+            freed = self.bytes
+            self._items = {}
+            self.bytes = 0
+            self.spilled = True
+            return freed
+
+    def _rehydrate(self):
+        self.spilled = False
+        record = self.registry.storage.get(self.storage_key())
+        if record is None:
+            return
+        try:
+            items = json.loads(record)
+        except ValueError as e:
+            logger.warning("Could not rehydrate session %s: %s", self.session_id, e)
+            return
+        for key, value in items.items():
+            size = approx_size(value)
+            self._items[key] = (value, size, False)
+            self.bytes += size
+        self.registry.rehydrations += 1
+
+    def discard(self):
+        self.registry.storage.delete(self.storage_key())
+
+
+class SessionRegistry:
+    def __init__(self, storage=None, idle_seconds=IDLE_SECONDS, sweep_interval=SWEEP_INTERVAL):
+        self.storage = storage or FileStorage(directories={"sessions": SPILL_DIR})
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.peak_bytes = 0
+        self.peak_sessions = 0
+        self.spills = 0
+        self.rehydrations = 0
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def session(self, session_id, activity=True):
+        with self._lock:
+            artifacts = self._sessions.get(session_id)
+            if artifacts is None:
+                artifacts = self._sessions[session_id] = SessionArtifacts(session_id, self)
+                self.peak_sessions = max(self.peak_sessions, len(self._sessions))
+        if activity:
+            artifacts.touch()
+        return artifacts
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(artifacts.bytes for artifacts in self._sessions.values())
+
+    def observe(self):
+        self.peak_bytes = max(self.peak_bytes, self.total_bytes())
+
+    def sweep(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for artifacts in sessions:
+            idle = now - artifacts.last_seen
+            if idle > EXPIRE_SECONDS:
+                with self._lock:
+                    self._sessions.pop(artifacts.session_id, None)
+                artifacts.discard()
+            elif idle > self.idle_seconds and artifacts.spill():
+                self.spills += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Session sweep failed")
+
+    def close(self):
+        self._stopped.set()
+
+    def snapshot(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": len(sessions),
+            "resident_sessions": sum(1 for artifacts in sessions if not artifacts.spilled),
+            "bytes": sum(artifacts.bytes for artifacts in sessions),
+            "peak_bytes": self.peak_bytes,
+            "peak_sessions": self.peak_sessions,
+            "evictions": sum(artifacts.evictions for artifacts in sessions),
+            "spills": self.spills,
+            "rehydrations": self.rehydrations,
+            "rss": current_rss(),
+            "peak_rss": peak_rss(),
+        }
@@ -0,0 +1,314 @@
+import os
+import re
+import threading
+from urllib.parse import urlparse
+
+from persistence import write_bytes_atomic
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:
+    class WatchError(Exception):
+        """A watched key changed before the transaction ran."""
+
+# Where memories, transcripts and spilled sessions are kept. Every replica
+# pointed at the same Redis can serve any user:
+#   file://<dir>        local files (the default, one replica)
+#   redis://host:6379/0 any Redis-compatible server (needs the redis package)
+#   local://            in-process stand-in with Redis semantics, for tests
+#                       and single-process runs
+STORAGE_URL = os.getenv("HIPPO_STORAGE_URL", "file://.")
+KEY_PREFIX = os.getenv("HIPPO_STORAGE_PREFIX", "hippo:")
+READ_BLOCK = 64 * 1024
+# Attempts at a read-modify-write before giving up on a contended key
+UPDATE_RETRIES = 10
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name) or "default"
+
+
+class FileStorage:
+    """Blobs are files; logs are newline-delimited files appended to.
+
+    Keys are "<namespace>/<file name>"; each namespace is a directory, by
+    default under `root`.
+    """
+
+    shared = False
+
+    def __init__(self, root=".", directories=None):
+        self.root = root
+        self.directories = directories or {}
+        self._lock = threading.Lock()
+
+    def path_for(self, key):
+        namespace, _, name = key.partition("/")
+        directory = self.directories.get(namespace) or os.path.join(self.root, namespace)
+        return os.path.join(directory, _safe_name(name))
+
+    def get(self, key):
+        try:
+            with open(self.path_for(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, value):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_bytes_atomic(path, value)
+
+    def update(self, key, fn):
+        """Replace the value with fn(current value or None); returns it.
+
+        Only atomic within this process, which is all file storage serves.
+        """
+        with self._lock:
+            value = fn(self.get(key))
+            self.put(key, value)
+            return value
+
+    def delete(self, key):
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def append(self, key, line):
+        path = self.path_for(key)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as f:
+                f.write(line + b"\n")
+
+    def log_length_hint(self, key):
+        # Only ever compared with zero, so the size in bytes will do
+        try:
+            return os.path.getsize(self.path_for(key))
+        except FileNotFoundError:
+            return 0
+
+    def reverse_log(self, key):
+        # Read whole blocks backwards from the end so paging through recent
+        # entries never touches the rest of the file.
+        try:
+            f = open(self.path_for(key), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            remainder = b""
+            while position > 0:
+                size = min(READ_BLOCK, position)
+                position -= size
+                f.seek(position)
+                lines = (f.read(size) + remainder).split(b"\n")
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    if line.strip():
+                        yield line
+            if remainder.strip():
+                yield remainder
+
+    def tail(self, key, skip, count):
+        """Up to `count` log entries, newest first, after skipping `skip`."""
+        entries = []
+        for i, line in enumerate(self.reverse_log(key)):
+            if i < skip:
+                continue
+            entries.append(line)
+            if len(entries) >= count:
+                break
+        return entries
+
+    def iter_log(self, key):
+        try:
+            f = open(self.path_for(key), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if line.strip():
+                    yield line.rstrip(b"\n")
+
+
+class LocalPipeline:
+    """WATCH/MULTI/EXEC on a LocalRedis, as redis-py pipelines do them."""
+
+    def __init__(self, server):
+        self.server = server
+        self._watched = {}
+        self._queued = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+    def watch(self, *keys):
+        for key in keys:
+            self._watched[key] = self.server._version(key)
+
+    def get(self, key):
+        if self._queued is None:
+            return self.server.get(key)
+        self._queued.append(("get", key))
+        return self
+
+    def multi(self):
+        self._queued = []
+
+    def set(self, key, value):
+        self._queued.append(("set", key, value))
+        return self
+
+    def execute(self):
+        server = self.server
+        with server._lock:
+            if any(server._versions.get(key, 0) != version for key, version in self._watched.items()):
+                raise WatchError("Watched variable changed.")
+            results = []
+            for command, key, *args in self._queued or []:
+                if command == "set":
+                    server._set(key, args[0])
+                    results.append(True)
+                else:
+                    results.append(server._values.get(key))
+        self.reset()
+        return results
+
+    def reset(self):
+        self._watched = {}
+        self._queued = None
+
+
+class LocalRedis:
+    """The handful of Redis commands RedisStorage uses, held in memory."""
+
+    def __init__(self):
+        self._values = {}
+        self._lists = {}
+        # Bumped on every write, for WATCH
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _version(self, key):
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def _set(self, key, value):
+        self._values[key] = bytes(value)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            return self._values.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._set(key, value)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                removed += (self._values.pop(key, None) is not None) + (self._lists.pop(key, None) is not None)
+                self._versions[key] = self._versions.get(key, 0) + 1
+            return removed
+
+    def rpush(self, key, *values):
+        with self._lock:
+            entries = self._lists.setdefault(key, [])
+            entries.extend(bytes(value) for value in values)
+            self._versions[key] = self._versions.get(key, 0) + 1
+            return len(entries)
+
+    def llen(self, key):
+        with self._lock:
+            return len(self._lists.get(key, []))
+
+    def lrange(self, key, start, stop):
+        with self._lock:
+            entries = self._lists.get(key, [])
+            # Redis ranges are inclusive and accept negative indexes
+            start = max(0, len(entries) + start) if start < 0 else start
+            stop = len(entries) + stop if stop < 0 else stop
+            return entries[start:stop + 1] if stop >= 0 else []
+
+    def pipeline(self):
+        return LocalPipeline(self)
+
+
+class RedisStorage:
+    """Blobs are strings; logs are lists, newest entry at the right."""
+
+    shared = True
+
+    def __init__(self, client, prefix=KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def put(self, key, value):
+        self.client.set(self.prefix + key, value)
+
+    def update(self, key, fn):
+        """Replace the value with fn(current value or None); returns it.
+
+        Optimistic: if another replica writes the key between the read and
+        the write, fn is run again on what it wrote.
+        """
+        key = self.prefix + key
+        for _ in range(UPDATE_RETRIES):
+            with self.client.pipeline() as pipe:
+                try:
+                    pipe.watch(key)
+                    value = fn(pipe.get(key))
+                    pipe.multi()
+                    pipe.set(key, value)
+                    pipe.execute()
+                    return value
+                except WatchError:
+                    continue
+        raise WatchError(f"{key} kept changing; gave up after {UPDATE_RETRIES} attempts")
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def append(self, key, line):
+        self.client.rpush(self.prefix + key, line)
+
+    def log_length_hint(self, key):
+        return self.client.llen(self.prefix + key)
+
+    def tail(self, key, skip, count):
+        entries = self.client.lrange(self.prefix + key, -(skip + count), -(skip + 1))
+        return list(reversed(entries))
+
+    def iter_log(self, key, batch=500):
+        start = 0
+        while True:
+            entries = self.client.lrange(self.prefix + key, start, start + batch - 1)
+            yield from entries
+            if len(entries) < batch:
+                return
+            start += batch
+
+
+def open_storage(url=STORAGE_URL, directories=None):
+    """Storage for `url`; `directories` relocates file namespaces."""
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return FileStorage(parsed.netloc + parsed.path or ".", directories)
+    if parsed.scheme == "local":
+        return RedisStorage(LocalRedis())
+    if parsed.scheme in ("redis", "rediss"):
+        import redis
+        return RedisStorage(redis.Redis.from_url(url))
+    raise ValueError(f"Unsupported storage URL: {url}")
@@ -0,0 +1,72 @@
+import os
+import re
+import json
+import time
+import threading
+
+from storage import FileStorage
+from conversation_archive import user_key
+
+TRANSCRIPT_DIR = os.getenv("HIPPO_TRANSCRIPT_DIR", "transcripts")
+
+
+def _legacy_name(user_id):
+    # Transcripts used to be keyed by the sanitized user id, under which
+    # "bob smith" and "bob_smith" shared a file
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", user_id) or "default"
+
+
+class TranscriptStore:
+    """Per-user append-only turn log, one JSON object per entry."""
+
+    def __init__(self, storage=None):
+        self.storage = storage or FileStorage(directories={"transcripts": TRANSCRIPT_DIR})
+        self._migrated = set()
+        self._lock = threading.Lock()
+
+    def key_for(self, user_id):
+        # Hashed like memories and the archive, so distinct ids never share
+        key = f"transcripts/{user_key(user_id)}.jsonl"
+        if user_id not in self._migrated:
+            self._migrate(user_id, key)
+        return key
+
+    def _migrate(self, user_id, key):
+        # Moves a log kept under the old name, once per user per process
+        with self._lock:
+            if user_id in self._migrated:
+                return
+            legacy = f"transcripts/{_legacy_name(user_id)}.jsonl"
+            if self.storage.log_length_hint(legacy) and not self.storage.log_length_hint(key):
+                for line in self.storage.iter_log(legacy):
+                    self.storage.append(key, line)
+                self.storage.delete(legacy)
+            self._migrated.add(user_id)
+
+    def append(self, user_id, user_text, coach_text, latencies=None, started=None):
+        turn = {
+            "started": started or time.time(),
+            "finished": time.time(),
+            "user": user_text,
+            "coach": coach_text,
+            "latency": latencies or {},
+        }
+        self.storage.append(self.key_for(user_id), json.dumps(turn).encode())
+        return turn
+
+    def recent(self, user_id, page=0, page_size=10):
+        """Return one page of turns, newest first; page 0 is the latest."""
+        lines = self.storage.tail(self.key_for(user_id), page * page_size, page_size)
+        return [json.loads(line) for line in lines]
+
+    def has_turns(self, user_id):
+        return self.storage.log_length_hint(self.key_for(user_id)) > 0
+
+    def full_text(self, user_id):
+        """The whole transcript as plain text, for download."""
+        parts = []
+        for line in self.storage.iter_log(self.key_for(user_id)):
+            turn = json.loads(line)
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(turn["started"]))
+            parts.append(f"[{stamp}] You: {turn['user']}\n[{stamp}] Coach: {turn['coach']}\n\n")
+        return "".join(parts)
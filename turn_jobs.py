@@ -0,0 +1,183 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Turns run as jobs, off the Streamlit script threads. Orchestration mostly
+# waits on providers and runs on a thread pool; CPU-heavy decoding runs in
+# worker processes so it never competes with UI reruns for the GIL.
+# Front-ends submit a turn and poll for its progress and result.
+TURN_WORKERS = int(os.getenv("HIPPO_TURN_WORKERS", "8"))
+# Turns allowed to wait for a free worker before new ones are turned away
+MAX_QUEUED = int(os.getenv("HIPPO_TURN_QUEUE", "32"))
+# 0 decodes in the turn's own thread
+CPU_PROCESSES = int(os.getenv("HIPPO_CPU_PROCESSES", "2"))
+# Finished jobs nobody collected are dropped after this long
+RESULT_TTL = float(os.getenv("HIPPO_TURN_RESULT_TTL", "600"))
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class TurnJob:
+    def __init__(self, job_id, session_id):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.state = PENDING
+        # Partial results (e.g. the transcription) published while running
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+
+class JobQueue:
+    def __init__(self, run_fn, workers=TURN_WORKERS, max_queued=MAX_QUEUED, expected=()):
+        """`run_fn(job, *args, **kwargs)` runs each job; `expected`
+        exceptions are user-facing failures and are not logged."""
+        self.run_fn = run_fn
+        self.workers = workers
+        self.max_queued = max_queued
+        self.expected = expected
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="turn")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+
+    def _expire(self):
+        cutoff = time.monotonic() - RESULT_TTL
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, session_id, *args, **kwargs):
+        with self._lock:
+            self._expire()
+            active = sum(1 for job in self._jobs.values() if not job.done.is_set())
+            if active >= self.workers + self.max_queued:
+                self.rejected += 1
+                raise QueueFull("Too many turns in progress")
+            job = TurnJob(uuid.uuid4().hex, session_id)
+            self._jobs[job.job_id] = job
+            self.submitted += 1
+        self._executor.submit(self._run, job, args, kwargs)
+        return job.job_id
+
+    def _run(self, job, args, kwargs):
+        job.started = time.monotonic()
+        job.state = RUNNING
+        try:
+            job.result = self.run_fn(job, *args, **kwargs)
+            job.state = DONE
+        except Exception as e:
+            if not isinstance(e, self.expected):
+                logger.exception("Turn job %s failed", job.job_id)
+            job.error = e
+            job.state = FAILED
+        finally:
+            job.finished = time.monotonic()
+            with self._lock:
+                self._wait_total += job.started - job.submitted
+                if job.state == DONE:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            job.done.set()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def collect(self, job_id):
+        """Remove and return a finished job, or None if it is not finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.done.is_set():
+                return None
+            return self._jobs.pop(job_id)
+
+    def snapshot(self):
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+            started = self.completed + self.failed
+            return {
+                "pending": states.count(PENDING),
+                "running": states.count(RUNNING),
+                "uncollected": states.count(DONE) + states.count(FAILED),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "mean_queue_wait": round(self._wait_total / started, 3) if started else None,
+            }
+
+
+class CpuPool:
+    """Worker processes for CPU-bound functions, started on first use."""
+
+    def __init__(self, processes=CPU_PROCESSES):
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.restarts = 0
+
+    def _get(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: the parent is full of threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def run(self, fn, *args, **kwargs):
+        """Call `fn` in a worker process; it and its arguments must pickle."""
+        if not self.processes:
+            return fn(*args, **kwargs)
+        self.calls += 1
+        executor = self._get()
+        try:
+            return executor.submit(fn, *args, **kwargs).result()
+        except BrokenProcessPool:
+            logger.warning("A CPU worker process died; restarting the pool")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+                    self.restarts += 1
+            return fn(*args, **kwargs)
+
+    def warm(self, fn):
+        # Start every worker and have each import what `fn` needs
+        if not self.processes:
+            return
+        executor = self._get()
+        try:
+            for future in [executor.submit(fn) for _ in range(self.processes)]:
+                future.result()
+        except BrokenProcessPool:
+            logger.warning("CPU worker processes could not start; running CPU work in-thread")
+            with self._lock:
+                self._executor = None
+                self.processes = 0
+
+    def snapshot(self):
+        return {"processes": self.processes, "calls": self.calls, "restarts": self.restarts}
@@ -0,0 +1,100 @@
+import os
+import gzip
+import json
+import time
+import random
+import hashlib
+import threading
+
+from conversation_archive import user_key
+
+# Opt-in capture of what each turn saw and how long every stage took, for
+# replay_traces.py to play back offline. Audio is kept only as a hash and
+# size; user ids are hashed.
+ENABLED = os.getenv("HIPPO_TRACE", "0") == "1"
+SAMPLE_RATE = float(os.getenv("HIPPO_TRACE_SAMPLE", "1.0"))
+TRACE_DIR = os.getenv("HIPPO_TRACE_DIR", "traces")
+TRACE_VERSION = 1
+
+_write_lock = threading.Lock()
+
+
+class NullTrace:
+    def record(self, **fields):
+        pass
+
+    def record_audio(self, path, container, seconds):
+        pass
+
+    def record_extraction(self, extracted, seconds, utterances):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class TurnTrace:
+    def __init__(self, user_id, budget, directory=TRACE_DIR):
+        self.budget = budget
+        self.directory = directory
+        self.fields = {"v": TRACE_VERSION, "started": time.time(), "user": user_key(user_id)}
+
+    def record(self, **fields):
+        self.fields.update(fields)
+
+    def record_audio(self, path, container, seconds):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(block)
+        self.fields["audio"] = {
+            "sha256": digest.hexdigest(),
+            "bytes": os.path.getsize(path),
+            "container": container,
+            "seconds": seconds,
+        }
+
+    def record_extraction(self, extracted, seconds, utterances):
+        # Background extraction finishes after the turn's record is written,
+        # so it gets a record of its own that names the turn
+        _write(self.directory, {
+            "v": TRACE_VERSION,
+            "kind": "extraction",
+            "user": self.fields["user"],
+            "turn": self.fields["started"],
+            "extraction": extracted,
+            "seconds": round(seconds, 4),
+            "utterances": utterances,
+        })
+
+    def finish(self):
+        self.fields["timings"] = {stage: round(seconds, 4) for stage, seconds in self.budget.timings.items()}
+        _write(self.directory, self.fields)
+
+
+def _write(directory, fields):
+    line = json.dumps(fields, separators=(",", ":")) + "\n"
+    # One gzip member per record; readers see a single continuous stream
+    path = os.path.join(directory, time.strftime("%Y-%m-%d", time.gmtime()) + ".jsonl.gz")
+    with _write_lock:
+        os.makedirs(directory, exist_ok=True)
+        with gzip.open(path, "ab") as f:
+            f.write(line.encode())
+
+
+def start(user_id, budget):
+    if ENABLED and random.random() < SAMPLE_RATE:
+        return TurnTrace(user_id, budget)
+    return NULL_TRACE
+
+
+def load(paths):
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
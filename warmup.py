@@ -0,0 +1,122 @@
+import os
+import time
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Written once the process is warm, for health checks to look at
+READY_FILE = os.getenv("HIPPO_READY_FILE", "/tmp/hippo_ready")
+HTTP_POOL_SIZE = int(os.getenv("HIPPO_HTTP_POOL", "16"))
+# Keep idle provider connections around between turns; httpx would
+# otherwise drop them after 5 seconds.
+KEEPALIVE_EXPIRY = float(os.getenv("HIPPO_KEEPALIVE", "120"))
+ELEVENLABS_URL = "https://api.elevenlabs.io"
+
+_lock = threading.Lock()
+_ready = threading.Event()
+_started = False
+_http_session = None
+_openai_client = None
+_ffmpeg_path = None
+_ffmpeg_checked = False
+
+
+def http_session():
+    """Shared requests session with a connection pool, for ElevenLabs."""
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+            _http_session = session
+        return _http_session
+
+
+def openai_client(api_key):
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            import httpx
+            import openai
+            http_client = openai.DefaultHttpxClient(limits=httpx.Limits(
+                max_connections=HTTP_POOL_SIZE,
+                max_keepalive_connections=HTTP_POOL_SIZE,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ))
+            # Retries are handled by the resilience layer, not the SDK
+            _openai_client = openai.OpenAI(api_key=api_key, max_retries=0, http_client=http_client)
+        return _openai_client
+
+
+def ffmpeg_path():
+    # Looked up once per process rather than on every turn
+    global _ffmpeg_path, _ffmpeg_checked
+    if not _ffmpeg_checked:
+        _ffmpeg_path = shutil.which("ffmpeg")
+        _ffmpeg_checked = True
+    return _ffmpeg_path
+
+
+def _open_connections(openai_api_key, elevenlabs_api_key):
+    # Any response will do: the point is the pooled TLS connection
+    try:
+        openai_client(openai_api_key).with_options(timeout=5).models.retrieve("gpt-4o-mini")
+    except Exception as e:
+        logger.warning("OpenAI warm-up request failed: %s", e)
+    try:
+        http_session().get(f"{ELEVENLABS_URL}/v1/models", headers={"xi-api-key": elevenlabs_api_key or ""}, timeout=5)
+    except Exception as e:
+        logger.warning("ElevenLabs warm-up request failed: %s", e)
+
+
+def warm_up(openai_api_key, elevenlabs_api_key, loaders=(), after_ready=()):
+    start = time.monotonic()
+    _open_connections(openai_api_key, elevenlabs_api_key)
+    if ffmpeg_path() is None:
+        logger.warning("ffmpeg not found on PATH; only in-process decoding is available")
+    for loader in loaders:
+        try:
+            loader()
+        except Exception:
+            logger.exception("Warm-up loader %r failed", loader)
+    _ready.set()
+    try:
+        with open(READY_FILE, "w") as f:
+            f.write(f"{time.time()}\n")
+    except OSError as e:
+        logger.warning("Could not write ready file %s: %s", READY_FILE, e)
+    logger.info("Warm-up finished in %.2fs", time.monotonic() - start)
+    for loader in after_ready:
+        try:
+            loader()
+        except Exception:
+            logger.exception("Post-warm-up loader %r failed", loader)
+
+
+def start(openai_api_key, elevenlabs_api_key, loaders=(), after_ready=()):
+    """Warm up on a background thread, once per process."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    # A ready file left over from a previous run would lie to health checks
+    try:
+        os.remove(READY_FILE)
+    except FileNotFoundError:
+        pass
+    threading.Thread(
+        target=warm_up, args=(openai_api_key, elevenlabs_api_key, loaders, after_ready), name="warm-up", daemon=True
+    ).start()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def wait_ready(timeout=None):
+    return _ready.wait(timeout)